@@ -26,6 +26,11 @@ from app.database import Base  # ✅ Importa Base una sola volta
 from app.models import transcripts, audio_files  # ✅ Importa i modelli
 from app.models import transcription_chunks
 from app.models import transcription_summaries
+from app.models import upload_sessions
+from app.models import tasks
+from app.models import transcription_cache
+from app.models import summary_llm_calls
+from app.models import summary_window_partials
 
 target_metadata = Base.metadata
 
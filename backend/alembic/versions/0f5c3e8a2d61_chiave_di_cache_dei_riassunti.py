@@ -0,0 +1,28 @@
+"""chiave di cache dei riassunti
+
+Revision ID: 0f5c3e8a2d61
+Revises: 6a2f9d4c8b17
+Create Date: 2026-10-16 19:14:50.226781
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f5c3e8a2d61'
+down_revision: Union[str, None] = '6a2f9d4c8b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('transcriptions_summaries', sa.Column('cache_key', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_transcriptions_summaries_cache_key'), 'transcriptions_summaries', ['cache_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_transcriptions_summaries_cache_key'), table_name='transcriptions_summaries')
+    op.drop_column('transcriptions_summaries', 'cache_key')
@@ -0,0 +1,56 @@
+"""cache dei risultati di trascrizione
+
+Revision ID: 1d8e4b7a9f30
+Revises: f3a9c6e1d275
+Create Date: 2026-10-16 18:05:12.418903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d8e4b7a9f30'
+down_revision: Union[str, None] = 'f3a9c6e1d275'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'transcription_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('audio_sha256', sa.String(length=64), nullable=False),
+        sa.Column('variant', sa.String(length=64), nullable=False),
+        sa.Column('start_seconds', sa.Float(), nullable=True),
+        sa.Column('end_seconds', sa.Float(), nullable=True),
+        sa.Column('model_id', sa.String(length=100), nullable=False),
+        sa.Column('language', sa.String(length=10), nullable=False),
+        sa.Column('prompt', sa.Text(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('audio_seconds', sa.Float(), nullable=False),
+        sa.Column('elapsed_seconds', sa.Float(), nullable=False),
+        sa.Column('cost_usd', sa.Float(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False),
+        sa.Column('saved_seconds', sa.Float(), nullable=False),
+        sa.Column('saved_usd', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_transcription_cache_id'), 'transcription_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_transcription_cache_cache_key'), 'transcription_cache', ['cache_key'], unique=True)
+    op.create_index(op.f('ix_transcription_cache_audio_sha256'), 'transcription_cache', ['audio_sha256'], unique=False)
+    op.create_index(op.f('ix_transcription_cache_last_used_at'), 'transcription_cache', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_transcription_cache_last_used_at'), table_name='transcription_cache')
+    op.drop_index(op.f('ix_transcription_cache_audio_sha256'), table_name='transcription_cache')
+    op.drop_index(op.f('ix_transcription_cache_cache_key'), table_name='transcription_cache')
+    op.drop_index(op.f('ix_transcription_cache_id'), table_name='transcription_cache')
+    op.drop_table('transcription_cache')
@@ -0,0 +1,67 @@
+"""audio_files su blob store indirizzato per contenuto
+
+Revision ID: 3f6c2a9e1b47
+Revises: d5b2e70b6c8c
+Create Date: 2026-10-16 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c2a9e1b47'
+down_revision: Union[str, None] = 'd5b2e70b6c8c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from app.services.blob_store import blob_store
+
+    op.add_column('audio_files', sa.Column('blob_key', sa.String(length=64), nullable=True))
+    op.add_column('audio_files', sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('audio_files', sa.Column('mime_type', sa.String(), nullable=True))
+
+    # Sposta i blob esistenti nello storage, una riga alla volta
+    conn = op.get_bind()
+    ids = [row[0] for row in conn.execute(sa.text("SELECT id FROM audio_files"))]
+    for audio_id in ids:
+        data = conn.execute(
+            sa.text("SELECT file_data FROM audio_files WHERE id = :id"), {"id": audio_id}
+        ).scalar()
+        writer = blob_store.open_writer()
+        writer.write(bytes(data))
+        blob_key, size_bytes = writer.commit()
+        conn.execute(
+            sa.text("UPDATE audio_files SET blob_key = :key, size_bytes = :size WHERE id = :id"),
+            {"key": blob_key, "size": size_bytes, "id": audio_id}
+        )
+
+    op.alter_column('audio_files', 'blob_key', nullable=False)
+    op.alter_column('audio_files', 'size_bytes', nullable=False)
+    op.create_index(op.f('ix_audio_files_blob_key'), 'audio_files', ['blob_key'], unique=False)
+    op.drop_column('audio_files', 'file_data')
+
+
+def downgrade() -> None:
+    from app.services.blob_store import blob_store
+
+    op.add_column('audio_files', sa.Column('file_data', sa.LargeBinary(), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, blob_key FROM audio_files")).fetchall()
+    for audio_id, blob_key in rows:
+        with blob_store.open(blob_key) as source:
+            conn.execute(
+                sa.text("UPDATE audio_files SET file_data = :data WHERE id = :id"),
+                {"data": source.read(), "id": audio_id}
+            )
+
+    op.alter_column('audio_files', 'file_data', nullable=False)
+    op.drop_index(op.f('ix_audio_files_blob_key'), table_name='audio_files')
+    op.drop_column('audio_files', 'mime_type')
+    op.drop_column('audio_files', 'size_bytes')
+    op.drop_column('audio_files', 'blob_key')
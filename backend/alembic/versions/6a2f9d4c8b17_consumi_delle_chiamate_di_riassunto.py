@@ -0,0 +1,49 @@
+"""consumi delle chiamate di riassunto
+
+Revision ID: 6a2f9d4c8b17
+Revises: 1d8e4b7a9f30
+Create Date: 2026-10-16 18:41:27.503116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a2f9d4c8b17'
+down_revision: Union[str, None] = '1d8e4b7a9f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'summary_llm_calls',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=True),
+        sa.Column('transcript_id', sa.Integer(), nullable=False),
+        sa.Column('phase', sa.String(length=20), nullable=False),
+        sa.Column('window_index', sa.Integer(), nullable=True),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('max_tokens', sa.Integer(), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False),
+        sa.Column('ttft_seconds', sa.Float(), nullable=True),
+        sa.Column('latency_seconds', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+        sa.ForeignKeyConstraint(['transcript_id'], ['transcripts.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_summary_llm_calls_id'), 'summary_llm_calls', ['id'], unique=False)
+    op.create_index(op.f('ix_summary_llm_calls_task_id'), 'summary_llm_calls', ['task_id'], unique=False)
+    op.create_index(op.f('ix_summary_llm_calls_transcript_id'), 'summary_llm_calls', ['transcript_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_summary_llm_calls_transcript_id'), table_name='summary_llm_calls')
+    op.drop_index(op.f('ix_summary_llm_calls_task_id'), table_name='summary_llm_calls')
+    op.drop_index(op.f('ix_summary_llm_calls_id'), table_name='summary_llm_calls')
+    op.drop_table('summary_llm_calls')
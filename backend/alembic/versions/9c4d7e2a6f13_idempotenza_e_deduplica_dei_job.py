@@ -0,0 +1,34 @@
+"""idempotenza e deduplica dei job
+
+Revision ID: 9c4d7e2a6f13
+Revises: e7a3c15b9d62
+Create Date: 2026-10-16 15:48:19.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d7e2a6f13'
+down_revision: Union[str, None] = 'e7a3c15b9d62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('idempotency_key', sa.String(length=255), nullable=True))
+    op.add_column('tasks', sa.Column('dedup_key', sa.String(length=255), nullable=True))
+    op.create_index('uq_tasks_type_idempotency_key', 'tasks', ['type', 'idempotency_key'], unique=True,
+                    postgresql_where=sa.text('idempotency_key IS NOT NULL'))
+    op.create_index('uq_tasks_dedup_key_in_flight', 'tasks', ['dedup_key'], unique=True,
+                    postgresql_where=sa.text("status IN ('pending', 'processing')"))
+
+
+def downgrade() -> None:
+    op.drop_index('uq_tasks_dedup_key_in_flight', table_name='tasks')
+    op.drop_index('uq_tasks_type_idempotency_key', table_name='tasks')
+    op.drop_column('tasks', 'dedup_key')
+    op.drop_column('tasks', 'idempotency_key')
@@ -0,0 +1,40 @@
+"""riassunti parziali delle finestre
+
+Revision ID: a4c71e9b3f58
+Revises: 0f5c3e8a2d61
+Create Date: 2026-10-16 19:48:03.917254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c71e9b3f58'
+down_revision: Union[str, None] = '0f5c3e8a2d61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'summary_window_partials',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('transcript_id', sa.Integer(), nullable=False),
+        sa.Column('window_key', sa.String(length=64), nullable=False),
+        sa.Column('partial_text', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['transcript_id'], ['transcripts.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('transcript_id', 'window_key', name='uq_summary_window_partials_transcript_window')
+    )
+    op.create_index(op.f('ix_summary_window_partials_id'), 'summary_window_partials', ['id'], unique=False)
+    op.create_index(op.f('ix_summary_window_partials_transcript_id'), 'summary_window_partials', ['transcript_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_summary_window_partials_transcript_id'), table_name='summary_window_partials')
+    op.drop_index(op.f('ix_summary_window_partials_id'), table_name='summary_window_partials')
+    op.drop_table('summary_window_partials')
@@ -0,0 +1,39 @@
+"""checkpoint dei chunk di trascrizione
+
+Revision ID: b6f1a8d3e904
+Revises: 9c4d7e2a6f13
+Create Date: 2026-10-16 16:27:51.230874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f1a8d3e904'
+down_revision: Union[str, None] = '9c4d7e2a6f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('params', sa.JSON(), nullable=True))
+    op.add_column('tasks', sa.Column('chunk_plan', sa.JSON(), nullable=True))
+    op.add_column('transcription_chunks', sa.Column('task_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('transcription_chunks_task_id_fkey', 'transcription_chunks', 'tasks', ['task_id'], ['id'])
+    op.create_index(op.f('ix_transcription_chunks_task_id'), 'transcription_chunks', ['task_id'], unique=False)
+    op.create_unique_constraint('uq_transcription_chunks_task_chunk', 'transcription_chunks', ['task_id', 'chunk_number'])
+    op.alter_column('transcription_chunks', 'transcript_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM transcription_chunks WHERE transcript_id IS NULL")
+    op.alter_column('transcription_chunks', 'transcript_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_constraint('uq_transcription_chunks_task_chunk', 'transcription_chunks', type_='unique')
+    op.drop_index(op.f('ix_transcription_chunks_task_id'), table_name='transcription_chunks')
+    op.drop_constraint('transcription_chunks_task_id_fkey', 'transcription_chunks', type_='foreignkey')
+    op.drop_column('transcription_chunks', 'task_id')
+    op.drop_column('tasks', 'chunk_plan')
+    op.drop_column('tasks', 'params')
@@ -0,0 +1,65 @@
+"""metadati audio e indice per la lista paginata
+
+Revision ID: c29e8b5d4a10
+Revises: a81d4c07e5f2
+Create Date: 2026-10-16 11:20:54.918305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c29e8b5d4a10'
+down_revision: Union[str, None] = 'a81d4c07e5f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from app.services.blob_store import blob_store
+    from app.utils.media_probe import probe_media
+
+    op.add_column('audio_files', sa.Column('duration_seconds', sa.Float(), nullable=True))
+    op.add_column('audio_files', sa.Column('codec', sa.String(), nullable=True))
+    op.add_column('audio_files', sa.Column('channels', sa.Integer(), nullable=True))
+    op.add_column('audio_files', sa.Column('sample_rate', sa.Integer(), nullable=True))
+    op.add_column('audio_files', sa.Column('bit_rate', sa.Integer(), nullable=True))
+    op.create_index('ix_audio_files_uploaded_at_id', 'audio_files', ['uploaded_at', 'id'], unique=False)
+
+    # La paginazione keyset richiede una data per ogni riga
+    conn = op.get_bind()
+    conn.execute(sa.text("UPDATE audio_files SET uploaded_at = now() WHERE uploaded_at IS NULL"))
+
+    # Metadati dei file già caricati
+    rows = conn.execute(sa.text("SELECT id, blob_key FROM audio_files")).fetchall()
+    for audio_id, blob_key in rows:
+        path = blob_store.local_path(blob_key)
+        metadata = probe_media(path) if path else None
+        if not metadata:
+            continue
+        conn.execute(
+            sa.text(
+                "UPDATE audio_files SET duration_seconds = :duration_seconds, codec = :codec, "
+                "channels = :channels, sample_rate = :sample_rate, bit_rate = :bit_rate WHERE id = :id"
+            ),
+            {
+                "duration_seconds": metadata["duration_seconds"],
+                "codec": metadata["codec"],
+                "channels": metadata["channels"],
+                "sample_rate": metadata["sample_rate"],
+                "bit_rate": metadata["bit_rate"],
+                "id": audio_id
+            }
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audio_files_uploaded_at_id', table_name='audio_files')
+    op.drop_column('audio_files', 'bit_rate')
+    op.drop_column('audio_files', 'sample_rate')
+    op.drop_column('audio_files', 'channels')
+    op.drop_column('audio_files', 'codec')
+    op.drop_column('audio_files', 'duration_seconds')
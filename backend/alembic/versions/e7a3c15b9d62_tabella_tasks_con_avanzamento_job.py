@@ -0,0 +1,53 @@
+"""tabella tasks con avanzamento dei job
+
+Revision ID: e7a3c15b9d62
+Revises: 5b7e0f93c2d8
+Create Date: 2026-10-16 15:02:44.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c15b9d62'
+down_revision: Union[str, None] = '5b7e0f93c2d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # La revisione d5b2e70b6c8c non aveva creato la tabella: la si crea qui con i campi di avanzamento
+    op.create_table('tasks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'processing', 'completed', 'failed', name='taskstatus'), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('celery_id', sa.String(), nullable=True),
+    sa.Column('stage', sa.String(), nullable=True),
+    sa.Column('progress', sa.Float(), nullable=False),
+    sa.Column('steps_done', sa.Integer(), nullable=False),
+    sa.Column('steps_total', sa.Integer(), nullable=True),
+    sa.Column('stages', sa.JSON(), nullable=True),
+    sa.Column('eta_seconds', sa.Float(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('audio_file_id', sa.Integer(), nullable=True),
+    sa.Column('transcript_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['audio_file_id'], ['audio_files.id'], ),
+    sa.ForeignKeyConstraint(['transcript_id'], ['transcripts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tasks_id'), 'tasks', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tasks_id'), table_name='tasks')
+    op.drop_table('tasks')
+    sa.Enum(name='taskstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,35 @@
+"""code e annullamento dei job
+
+Revision ID: f3a9c6e1d275
+Revises: b6f1a8d3e904
+Create Date: 2026-10-16 17:12:36.847209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c6e1d275'
+down_revision: Union[str, None] = 'b6f1a8d3e904'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ALTER TYPE ... ADD VALUE non può girare in una transazione
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE taskstatus ADD VALUE IF NOT EXISTS 'cancelled'")
+    op.add_column('tasks', sa.Column('owner_id', sa.String(length=255), nullable=True))
+    op.add_column('tasks', sa.Column('queue', sa.String(length=20), nullable=True))
+    op.create_index(op.f('ix_tasks_owner_id'), 'tasks', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tasks_owner_id'), table_name='tasks')
+    op.drop_column('tasks', 'queue')
+    op.drop_column('tasks', 'owner_id')
+    # Postgres non permette di rimuovere un valore da un enum: i job annullati diventano falliti
+    op.execute("UPDATE tasks SET status = 'failed' WHERE status = 'cancelled'")
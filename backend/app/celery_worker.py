@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from kombu import Queue
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,10 +18,25 @@ celery.conf.update(
     task_always_eager=False,
     task_acks_late=True,
     worker_prefetch_multiplier=1,
+    # Con acks_late un worker che muore a metà task rimette il messaggio in coda
+    task_reject_on_worker_lost=True,
+    broker_transport_options={
+        # Un task non confermato torna in coda solo dopo questo tempo: deve superare il task più lungo
+        "visibility_timeout": 4 * 3600,
+        # Un worker che consuma più code le svuota nell'ordine indicato con -Q (interactive prima di bulk)
+        "queue_order_strategy": "priority",
+        # Priorità dei messaggi all'interno di ogni coda (0 = più alta)
+        "priority_steps": list(range(10)),
+    },
+    task_queues=(Queue("interactive"), Queue("bulk")),
+    task_default_queue="interactive",
+    task_default_priority=5,
+    task_track_started=True,
+    result_expires=7 * 24 * 3600,
 )
 
 # Import esplicito dei task per forzarne la registrazione
-from app.tasks import transcription_tasks
+from app.tasks import transcription_tasks, summary_tasks
 
 
 @celery.task
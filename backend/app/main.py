@@ -1,7 +1,9 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import audio, transcriptions, summaries, onedrive
+from app.routers import audio, transcriptions, summaries, onedrive, jobs
 from app.routers.websocket_manager import router as websocket_router, websocket_manager
+from app.utils.metrics import metrics
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
@@ -38,10 +40,16 @@ app.include_router(audio.router)
 app.include_router(transcriptions.router)
 app.include_router(summaries.router)
 app.include_router(onedrive.router)
+app.include_router(jobs.router)
 app.include_router(websocket_router)
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "auth_method": "headers_only"}
 
+# Metriche di API e worker Celery, raccolte su Redis
+@app.get("/metrics")
+async def get_metrics():
+    return await asyncio.to_thread(metrics.snapshot)
+
 logger.info("🚀 Modello231 App - Header-based Auth")
\ No newline at end of file
@@ -2,3 +2,8 @@ from app.models.audio_files import AudioFile
 from app.models.transcripts import Transcript
 from app.models.transcription_chunks import TranscriptionChunk
 from app.models.transcription_summaries import TranscriptionSummary
+from app.models.upload_sessions import UploadSession, UploadPart
+from app.models.tasks import Task, TaskStatus
+from app.models.transcription_cache import TranscriptionCacheEntry
+from app.models.summary_llm_calls import SummaryLLMCall
+from app.models.summary_window_partials import SummaryWindowPartial
@@ -1,14 +1,25 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base 
 
 class AudioFile(Base):
     __tablename__ = "audio_files"
+    # Indice per la paginazione keyset della lista (uploaded_at, id)
+    __table_args__ = (Index("ix_audio_files_uploaded_at_id", "uploaded_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     file_name = Column(String, nullable=False)  
-    file_data = Column(LargeBinary, nullable=False)  
+    blob_key = Column(String(64), nullable=False, index=True)  # SHA-256 del contenuto nel blob store
+    size_bytes = Column(BigInteger, nullable=False)
+    mime_type = Column(String, nullable=True)
     uploaded_at = Column(DateTime, default=datetime.utcnow)  
 
+    # Metadati letti una sola volta con ffprobe al momento dell'upload
+    duration_seconds = Column(Float, nullable=True)
+    codec = Column(String, nullable=True)
+    channels = Column(Integer, nullable=True)
+    sample_rate = Column(Integer, nullable=True)
+    bit_rate = Column(Integer, nullable=True)
+
     transcripts = relationship("Transcript", back_populates="audio") 
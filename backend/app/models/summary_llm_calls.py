@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from datetime import datetime
+from app.database import Base
+
+
+class SummaryLLMCall(Base):
+    __tablename__ = "summary_llm_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True, index=True)
+    transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=False, index=True)
+    phase = Column(String(20), nullable=False)  # single, map, condense, reduce
+    window_index = Column(Integer, nullable=True)
+    model = Column(String(100), nullable=False)
+    max_tokens = Column(Integer, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    ttft_seconds = Column(Float, nullable=True)  # tempo al primo token
+    latency_seconds = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
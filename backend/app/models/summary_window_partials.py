@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from app.database import Base
+
+
+class SummaryWindowPartial(Base):
+    """Riassunto parziale di una finestra della trascrizione, riusato finché il testo della finestra non cambia."""
+
+    __tablename__ = "summary_window_partials"
+    __table_args__ = (
+        UniqueConstraint("transcript_id", "window_key", name="uq_summary_window_partials_transcript_window"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=False, index=True)
+    # Hash di testo della finestra, versione dei prompt, modello e parametri
+    window_key = Column(String(64), nullable=False)
+    partial_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Float, JSON, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -9,6 +9,7 @@ class TaskStatus(enum.Enum):
     processing = "processing"
     completed = "completed"
     failed = "failed"
+    cancelled = "cancelled"
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -21,6 +22,37 @@ class Task(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # opzionale se vuoi collegarlo a una trascrizione
-    #transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=True)
-    #transcript = relationship("Transcript", back_populates="tasks")
+    # Avanzamento: fase corrente, percentuale, passi della fase (es. chunk trascritti) e stima del tempo residuo
+    celery_id = Column(String, nullable=True)  # id dei task Celery separati da virgole (chain di trascrizione)
+    stage = Column(String, nullable=True)  # es. 'queued', 'transcoding', 'transcribing'
+    progress = Column(Float, nullable=False, default=0.0)
+    steps_done = Column(Integer, nullable=False, default=0)
+    steps_total = Column(Integer, nullable=True)
+    stages = Column(JSON, nullable=True)  # tempi di inizio/fine di ogni fase
+    eta_seconds = Column(Float, nullable=True)
+    version = Column(Integer, nullable=False, default=0)  # incrementata a ogni aggiornamento
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Parametri del job e piano dei chunk, per riprendere un job interrotto dagli stessi tagli
+    params = Column(JSON, nullable=True)
+    chunk_plan = Column(JSON, nullable=True)
+
+    # Utente che ha avviato il job e coda Celery assegnata ('interactive' o 'bulk')
+    owner_id = Column(String(255), nullable=True, index=True)
+    queue = Column(String(20), nullable=True)
+
+    audio_file_id = Column(Integer, ForeignKey("audio_files.id"), nullable=True)
+    transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=True)
+
+    # Idempotency-Key fornita dal client e chiave del lavoro (audio/trascrizione, modello, parametri)
+    idempotency_key = Column(String(255), nullable=True)
+    dedup_key = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        Index("uq_tasks_type_idempotency_key", "type", "idempotency_key", unique=True,
+              postgresql_where=text("idempotency_key IS NOT NULL")),
+        # Al più un job in corso per lo stesso lavoro: le richieste identiche si agganciano a quello
+        Index("uq_tasks_dedup_key_in_flight", "dedup_key", unique=True,
+              postgresql_where=text("status IN ('pending', 'processing')")),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Float, Text, JSON, DateTime
+from datetime import datetime
+from app.database import Base
+
+
+class TranscriptionCacheEntry(Base):
+    __tablename__ = "transcription_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # SHA-256 di (audio, variante, intervallo, modello, lingua, prompt)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)
+    audio_sha256 = Column(String(64), nullable=False, index=True)
+    variant = Column(String(64), nullable=False)  # preparazione dell'audio (passthrough, profilo di transcodifica, vad)
+    start_seconds = Column(Float, nullable=True)  # NULL: file intero
+    end_seconds = Column(Float, nullable=True)
+    model_id = Column(String(100), nullable=False)
+    language = Column(String(10), nullable=False)
+    prompt = Column(Text, nullable=True)
+    result = Column(JSON, nullable=False)  # {"language", "segments", "transcription"}
+    size_bytes = Column(Integer, nullable=False)
+    audio_seconds = Column(Float, nullable=False)
+    elapsed_seconds = Column(Float, nullable=False)  # tempo speso per ottenere il risultato
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    hits = Column(Integer, nullable=False, default=0)
+    saved_seconds = Column(Float, nullable=False, default=0.0)
+    saved_usd = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import JSON, Column, Integer, Float, Text, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -7,9 +7,18 @@ class TranscriptionChunk(Base):
     __tablename__ = "transcription_chunks"
 
     id = Column(Integer, primary_key=True, index=True)
-    transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=False)
+    # Valorizzato all'unione finale; fino ad allora il chunk è un checkpoint del job che lo ha prodotto
+    transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True, index=True)
     chunk_number = Column(Integer, nullable=False)  
     chunk_text = Column(Text, nullable=False)
+    start_time = Column(Float, nullable=True)  # offset del chunk nel file originale (secondi)
+    end_time = Column(Float, nullable=True)
+    segments = Column(JSON, nullable=True)  # segmenti con timestamp già riportati al file originale
     created_at = Column(DateTime, default=datetime.utcnow)
 
     transcript = relationship("Transcript", back_populates="chunks", foreign_keys=[transcript_id])
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "chunk_number", name="uq_transcription_chunks_task_chunk"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -9,6 +9,8 @@ class TranscriptionSummary(Base):
     id = Column(Integer, primary_key=True, index=True)
     transcript_id = Column(Integer, ForeignKey("transcripts.id"), nullable=False)
     summary_text = Column(Text, nullable=True)
+    # Hash di testo della trascrizione, versione del prompt, modello e parametri; NULL se non riutilizzabile
+    cache_key = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     transcript = relationship("Transcript", back_populates="summary", foreign_keys=[transcript_id])
\ No newline at end of file
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True)  # uuid4 generato all'apertura della sessione
+    file_name = Column(String, nullable=False)
+    mime_type = Column(String, nullable=True)
+    total_parts = Column(Integer, nullable=False)
+    total_size = Column(BigInteger, nullable=True)
+    status = Column(String, nullable=False, default="open")  # open, completed, aborted
+    audio_id = Column(Integer, ForeignKey("audio_files.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    parts = relationship("UploadPart", back_populates="session")
+
+
+class UploadPart(Base):
+    __tablename__ = "upload_parts"
+    __table_args__ = (UniqueConstraint("session_id", "part_number", name="uq_upload_parts_session_part"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(36), ForeignKey("upload_sessions.id"), nullable=False, index=True)
+    part_number = Column(Integer, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    session = relationship("UploadSession", back_populates="parts")
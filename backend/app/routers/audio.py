@@ -1,14 +1,87 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Header, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
 from app.models.audio_files import AudioFile
+from app.models.transcripts import Transcript
+from app.models.upload_sessions import UploadSession, UploadPart
 from app.database import get_db
 from app.models import *
 from app.routers.websocket_manager import websocket_manager;
+from app.services.blob_store import blob_store, store_upload
+from app.services.upload_sessions import write_part, assemble_parts, discard_session
+from app.utils.media_probe import probe_media
+from app.utils.http_range import (
+    BlobStreamResponse, RangeNotSatisfiable, parse_range_header,
+    http_date, parse_http_date, etag_matches
+)
+from fastapi import Response
+import asyncio
+import base64
 import uuid
 
 router = APIRouter()
 
+class UploadSessionCreateRequest(BaseModel):
+    file_name: str
+    total_parts: int
+    mime_type: Optional[str] = None
+    total_size: Optional[int] = None
+
+async def _find_duplicate(blob_key: str, db: AsyncSession):
+    """
+    Cerca un AudioFile già caricato con lo stesso contenuto (stesso SHA-256)
+    e l'ultima trascrizione disponibile per quel contenuto.
+    """
+    result = await db.execute(
+        select(AudioFile.id).filter(AudioFile.blob_key == blob_key).order_by(AudioFile.id).limit(1)
+    )
+    audio_id = result.scalar_one_or_none()
+    if audio_id is None:
+        return None, None
+
+    result = await db.execute(
+        select(Transcript.id)
+        .join(AudioFile, Transcript.audio_id == AudioFile.id)
+        .filter(AudioFile.blob_key == blob_key)
+        .order_by(Transcript.created_at.desc())
+        .limit(1)
+    )
+    return audio_id, result.scalar_one_or_none()
+
+
+async def _probe_blob(blob_key: str) -> dict:
+    """Metadati audio del blob (durata, codec, canali...), letti una volta sola all'upload."""
+    path = blob_store.local_path(blob_key)
+    if not path:
+        return {}
+    metadata = await asyncio.to_thread(probe_media, path)
+    if not metadata:
+        return {}
+    print(f"🎚️ Metadati audio: {metadata}")
+    return {
+        "duration_seconds": metadata["duration_seconds"],
+        "codec": metadata["codec"],
+        "channels": metadata["channels"],
+        "sample_rate": metadata["sample_rate"],
+        "bit_rate": metadata["bit_rate"],
+    }
+
+
+def _duplicate_response(audio_id: int, transcript_id: Optional[int]) -> dict:
+    print(f"♻️ Contenuto già presente: audio_file_id={audio_id}, transcript_id={transcript_id}")
+    return {
+        "audio_file_id": audio_id,
+        "transcript_id": transcript_id,
+        "duplicate": True,
+        "message": "File già presente, riutilizzato il caricamento esistente"
+    }
+
+
 # API che permette il caricamento di un file audio e il salvataggio a DB
 @router.post("/audio/upload")
 async def upload_audio(audio_file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
@@ -19,11 +92,24 @@ async def upload_audio(audio_file: UploadFile = File(...), db: AsyncSession = De
     print(f"Nome del file ricevuto: {audio_file.filename}")
     
     try:
-        file_content = await audio_file.read()  
-        print(f"📦 Dimensione del file: {len(file_content)} byte")
+        # Salvataggio in streaming nel blob store, a blocchi di dimensione fissa
+        blob_key, size_bytes = await store_upload(audio_file)
+        print(f"📦 Dimensione del file: {size_bytes} byte, chiave: {blob_key}")
+
+        # ⭐ DEDUPLICA: stesso contenuto già caricato, niente nuovo record né nuova trascrizione
+        duplicate_id, transcript_id = await _find_duplicate(blob_key, db)
+        if duplicate_id is not None:
+            await websocket_manager.send_notification("File già presente")
+            return _duplicate_response(duplicate_id, transcript_id)
 
-        # Crea un nuovo record nel database
-        new_audio = AudioFile(file_name=audio_file.filename, file_data=file_content)
+        # Crea un nuovo record nel database (solo riferimento al blob)
+        new_audio = AudioFile(
+            file_name=audio_file.filename,
+            blob_key=blob_key,
+            size_bytes=size_bytes,
+            mime_type=audio_file.content_type,
+            **(await _probe_blob(blob_key))
+        )
         db.add(new_audio)
         await db.commit()
         await db.refresh(new_audio)
@@ -35,6 +121,7 @@ async def upload_audio(audio_file: UploadFile = File(...), db: AsyncSession = De
         return {
             "audio_file_id": new_audio.id, 
             "job_id": job_id, 
+            "duplicate": False,
             "message": "File caricato con successo!"
         }
 
@@ -43,13 +130,317 @@ async def upload_audio(audio_file: UploadFile = File(...), db: AsyncSession = De
         raise HTTPException(status_code=500, detail=f"Errore durante l'upload: {str(e)}")
 
 
-# API per ottenere la lista dei file audio caricati, Restituisce ID, nome file e data di caricamento.
+def _encode_cursor(uploaded_at: datetime, audio_id: int) -> str:
+    raw = f"{uploaded_at.isoformat()}|{audio_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        uploaded_at, audio_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(uploaded_at), int(audio_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
+
+
+# API per ottenere la lista dei file audio caricati, dal più recente.
+# Paginazione keyset su (uploaded_at, id): legge solo le colonne necessarie, mai il contenuto audio.
 @router.get("/audio")
-async def get_audio_files(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(AudioFile))
-    audio_files = result.scalars().all()
-
-    return [
-        {"id": file.id, "file_name": file.file_name, "uploaded_at": file.uploaded_at}
-        for file in audio_files
-    ]
+async def get_audio_files(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    name_prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    query = select(
+        AudioFile.id,
+        AudioFile.file_name,
+        AudioFile.uploaded_at,
+        AudioFile.size_bytes,
+        AudioFile.mime_type,
+        AudioFile.duration_seconds,
+        AudioFile.codec,
+        AudioFile.channels,
+        AudioFile.sample_rate,
+    )
+
+    if date_from:
+        query = query.filter(AudioFile.uploaded_at >= date_from)
+    if date_to:
+        query = query.filter(AudioFile.uploaded_at < date_to)
+    if name_prefix:
+        query = query.filter(AudioFile.file_name.startswith(name_prefix, autoescape=True))
+    if cursor:
+        cursor_date, cursor_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            AudioFile.uploaded_at < cursor_date,
+            and_(AudioFile.uploaded_at == cursor_date, AudioFile.id < cursor_id)
+        ))
+
+    query = query.order_by(AudioFile.uploaded_at.desc(), AudioFile.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    rows = result.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1].uploaded_at, rows[-1].id) if has_more else None
+
+    return {
+        "items": [
+            {
+                "id": row.id,
+                "file_name": row.file_name,
+                "uploaded_at": row.uploaded_at,
+                "size_bytes": row.size_bytes,
+                "mime_type": row.mime_type,
+                "duration_seconds": row.duration_seconds,
+                "codec": row.codec,
+                "channels": row.channels,
+                "sample_rate": row.sample_rate,
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+# ⭐ UPLOAD RIPRENDIBILE A PARTI
+
+# Apre una sessione di upload multipart
+@router.post("/audio/uploads")
+async def create_upload_session(request: UploadSessionCreateRequest, db: AsyncSession = Depends(get_db)):
+    if request.total_parts < 1:
+        raise HTTPException(status_code=400, detail="Il numero di parti deve essere almeno 1")
+
+    session = UploadSession(
+        id=str(uuid.uuid4()),
+        file_name=request.file_name,
+        mime_type=request.mime_type,
+        total_parts=request.total_parts,
+        total_size=request.total_size,
+        status="open"
+    )
+    db.add(session)
+    await db.commit()
+    print(f"🆕 Sessione di upload creata: {session.id} ({session.total_parts} parti)")
+
+    return {"upload_id": session.id, "total_parts": session.total_parts}
+
+
+async def _get_open_session(upload_id: str, db: AsyncSession, for_update: bool = False) -> UploadSession:
+    query = select(UploadSession).filter(UploadSession.id == upload_id)
+    if for_update:
+        # Blocca la riga: due finalizzazioni concorrenti non assemblano due volte
+        query = query.with_for_update()
+    result = await db.execute(query)
+    session = result.scalar_one_or_none()
+
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessione di upload non trovata")
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Sessione di upload non aperta (stato: {session.status})")
+
+    return session
+
+
+# Carica una parte numerata (1..total_parts); le parti possono arrivare in qualsiasi ordine e in parallelo
+@router.put("/audio/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    x_checksum_sha256: str = Header(...),
+    db: AsyncSession = Depends(get_db)
+):
+    session = await _get_open_session(upload_id, db)
+
+    if part_number < 1 or part_number > session.total_parts:
+        raise HTTPException(status_code=400, detail=f"Numero di parte non valido: {part_number}")
+
+    size, digest = await write_part(upload_id, part_number, request.stream(), x_checksum_sha256)
+
+    # Un nuovo invio della stessa parte sostituisce quello precedente
+    result = await db.execute(
+        select(UploadPart).filter(UploadPart.session_id == upload_id, UploadPart.part_number == part_number)
+    )
+    part = result.scalar_one_or_none()
+    if part:
+        part.size_bytes = size
+        part.sha256 = digest
+        part.created_at = datetime.utcnow()
+    else:
+        db.add(UploadPart(session_id=upload_id, part_number=part_number, size_bytes=size, sha256=digest))
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Stessa parte inviata due volte in parallelo: il file su disco è già quello corretto
+        await db.rollback()
+
+    return {"upload_id": upload_id, "part_number": part_number, "size": size, "sha256": digest}
+
+
+# Stato della sessione: parti ricevute e parti mancanti
+@router.get("/audio/uploads/{upload_id}")
+async def get_upload_session(upload_id: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(UploadSession).filter(UploadSession.id == upload_id))
+    session = result.scalar_one_or_none()
+
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessione di upload non trovata")
+
+    result = await db.execute(
+        select(UploadPart.part_number, UploadPart.size_bytes, UploadPart.sha256)
+        .filter(UploadPart.session_id == upload_id)
+        .order_by(UploadPart.part_number)
+    )
+    parts = result.all()
+    received = {p.part_number for p in parts}
+
+    return {
+        "upload_id": session.id,
+        "file_name": session.file_name,
+        "status": session.status,
+        "total_parts": session.total_parts,
+        "received_parts": [
+            {"part_number": p.part_number, "size": p.size_bytes, "sha256": p.sha256} for p in parts
+        ],
+        "missing_parts": [n for n in range(1, session.total_parts + 1) if n not in received],
+        "audio_file_id": session.audio_id
+    }
+
+
+# Finalizza la sessione: concatena le parti nel blob store e crea l'AudioFile
+@router.post("/audio/uploads/{upload_id}/complete")
+async def complete_upload_session(upload_id: str, db: AsyncSession = Depends(get_db)):
+    session = await _get_open_session(upload_id, db, for_update=True)
+
+    result = await db.execute(
+        select(UploadPart.part_number, UploadPart.size_bytes).filter(UploadPart.session_id == upload_id)
+    )
+    parts = result.all()
+    received = {p.part_number for p in parts}
+    missing = [n for n in range(1, session.total_parts + 1) if n not in received]
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "Parti mancanti", "missing_parts": missing})
+
+    total_size = sum(p.size_bytes for p in parts)
+    if session.total_size is not None and total_size != session.total_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Dimensione totale non valida: attesa {session.total_size}, ricevuta {total_size}"
+        )
+
+    try:
+        blob_key, size_bytes = await asyncio.to_thread(assemble_parts, upload_id, session.total_parts)
+        print(f"📦 Upload {upload_id} assemblato: {size_bytes} byte, chiave: {blob_key}")
+
+        duplicate_id, transcript_id = await _find_duplicate(blob_key, db)
+        if duplicate_id is not None:
+            audio_id = duplicate_id
+        else:
+            new_audio = AudioFile(
+                file_name=session.file_name,
+                blob_key=blob_key,
+                size_bytes=size_bytes,
+                mime_type=session.mime_type,
+                **(await _probe_blob(blob_key))
+            )
+            db.add(new_audio)
+            await db.flush()
+            audio_id = new_audio.id
+
+        session.status = "completed"
+        session.audio_id = audio_id
+        session.completed_at = datetime.utcnow()
+        await db.commit()
+
+    except Exception as e:
+        await db.rollback()
+        print(f"Errore durante la finalizzazione dell'upload: {e}")
+        raise HTTPException(status_code=500, detail=f"Errore durante la finalizzazione dell'upload: {str(e)}")
+
+    discard_session(upload_id)
+
+    if duplicate_id is not None:
+        await websocket_manager.send_notification("File già presente")
+        return {**_duplicate_response(audio_id, transcript_id), "upload_id": upload_id}
+
+    await websocket_manager.send_notification("File salvato con successo")
+    return {
+        "audio_file_id": audio_id,
+        "upload_id": upload_id,
+        "duplicate": False,
+        "message": "File caricato con successo!"
+    }
+
+
+# Annulla una sessione e rimuove le parti già caricate
+@router.delete("/audio/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str, db: AsyncSession = Depends(get_db)):
+    session = await _get_open_session(upload_id, db)
+    session.status = "aborted"
+    await db.commit()
+    discard_session(upload_id)
+    return {"upload_id": upload_id, "status": "aborted"}
+
+
+# Streaming dell'audio originale per la riproduzione nell'editor, con supporto a Range,
+# ETag e richieste condizionali: un seek in una registrazione lunga costa pochi KB.
+@router.api_route("/audio/{audio_id}/stream", methods=["GET", "HEAD"])
+async def stream_audio(audio_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(AudioFile.blob_key, AudioFile.size_bytes, AudioFile.mime_type, AudioFile.uploaded_at)
+        .filter(AudioFile.id == audio_id)
+    )
+    audio = result.one_or_none()
+
+    if not audio:
+        raise HTTPException(status_code=404, detail="File audio non trovato")
+
+    # Il contenuto è indirizzato per SHA-256: la chiave è un ETag forte e immutabile
+    etag = f'"{audio.blob_key}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if audio.uploaded_at:
+        headers["Last-Modified"] = http_date(audio.uploaded_at)
+
+    # ⭐ RICHIESTE CONDIZIONALI
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif audio.uploaded_at and request.headers.get("if-modified-since"):
+        since = parse_http_date(request.headers["if-modified-since"])
+        if since and parse_http_date(headers["Last-Modified"]) <= since:
+            return Response(status_code=304, headers=headers)
+
+    size = audio.size_bytes
+    start, end = 0, size - 1
+    status_code = 200
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, headers.get("Last-Modified"))):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    return BlobStreamResponse(
+        lambda: blob_store.open(audio.blob_key),
+        offset=start,
+        length=end - start + 1,
+        status_code=status_code,
+        headers=headers,
+        media_type=audio.mime_type or "application/octet-stream"
+    )
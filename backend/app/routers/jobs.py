@@ -0,0 +1,195 @@
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, AsyncSessionLocal
+from app.models.tasks import TaskStatus
+from app.services.admission import admit_job, admission_lease
+from app.services.jobs import (
+    get_job, job_to_dict, reopen_job, update_job, cancel_job, fair_priority, TERMINAL_STATUSES
+)
+from app.services.job_events import job_event_hub, read_job_stream
+from app.tasks.transcription_tasks import start_transcription_job
+from app.tasks.summary_tasks import summarize_transcript
+from app.celery_worker import celery
+
+router = APIRouter()
+
+# Intervallo dei commenti di keep-alive sullo stream SSE (proxy e browser chiudono le connessioni inattive)
+SSE_HEARTBEAT_SECONDS = 15
+
+
+async def _load_snapshot(job_id: int) -> dict:
+    async with AsyncSessionLocal() as db:
+        task = await get_job(db, job_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job_to_dict(task)
+
+
+def _is_terminal(snapshot: dict) -> bool:
+    return snapshot["status"] in {status.value for status in TERMINAL_STATUSES}
+
+
+# Stato corrente di un job (trascrizione o riassunto)
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: int, db: AsyncSession = Depends(get_db)):
+    task = await get_job(db, job_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job_to_dict(task)
+
+
+# ⭐ LONG-POLL: risponde appena il job supera la versione `since`, o allo scadere del timeout
+@router.get("/jobs/{job_id}/wait")
+async def wait_job(job_id: int, since: int = -1, timeout: float = Query(25, ge=0, le=60)):
+    # Ci si iscrive prima di leggere il DB, così nessun aggiornamento va perso nel mezzo
+    queue = job_event_hub.subscribe(job_id)
+    try:
+        snapshot = await _load_snapshot(job_id)
+        if snapshot["version"] > since or _is_terminal(snapshot):
+            return snapshot
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                update = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if update.get("type") == "delta":
+                continue
+            if update["version"] > since:
+                return update
+
+        # Timeout: lo stato dal DB copre anche eventuali notifiche perse
+        return await _load_snapshot(job_id)
+    finally:
+        job_event_hub.unsubscribe(job_id, queue)
+
+
+def _delta_event(job_id: int, offset: int, text: str) -> str:
+    return f"event: delta\ndata: {json.dumps({'job_id': job_id, 'offset': offset, 'text': text})}\n\n"
+
+
+# ⭐ SSE: un evento "job" per ogni aggiornamento del job e, per i riassunti, eventi "delta" con il
+# testo man mano che viene generato ({offset, text}: il client sostituisce il testo da `offset` in poi).
+# Lo stream si chiude quando il job termina.
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, request: Request):
+    queue = job_event_hub.subscribe(job_id)
+    try:
+        snapshot = await _load_snapshot(job_id)
+    except HTTPException:
+        job_event_hub.unsubscribe(job_id, queue)
+        raise
+
+    async def event_stream():
+        try:
+            version = snapshot["version"]
+            yield f"id: {version}\nevent: job\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            if _is_terminal(snapshot):
+                return
+
+            # Testo già generato prima della connessione
+            sent = 0
+            text = await read_job_stream(job_id)
+            if text:
+                sent = len(text)
+                yield _delta_event(job_id, 0, text)
+
+            while not await request.is_disconnected():
+                try:
+                    update = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if update.get("type") == "delta":
+                    offset, text = update["offset"], update["text"]
+                    if offset > sent:
+                        # Frammenti persi (client lento): si reinvia il testo completo da Redis
+                        offset, text = 0, await read_job_stream(job_id)
+                    elif offset + len(text) <= sent and offset > 0:
+                        continue
+                    sent = offset + len(text)
+                    yield _delta_event(job_id, offset, text)
+                    continue
+                if update["version"] <= version:
+                    continue
+                version = update["version"]
+                yield f"id: {version}\nevent: job\ndata: {json.dumps(update, default=str)}\n\n"
+                if _is_terminal(update):
+                    return
+        finally:
+            job_event_hub.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ⭐ RIPRESA: un job fallito o annullato riparte dai checkpoint, ritrascrivendo solo i chunk mancanti
+# Come un nuovo job, passa dal controllo di ammissione (limiti per utente e globali).
+@router.post("/jobs/{job_id}/retry", status_code=202, dependencies=[Depends(admission_lease)])
+async def retry_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    task = await get_job(db, job_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    if task.status not in (TaskStatus.failed, TaskStatus.cancelled):
+        raise HTTPException(status_code=409, detail="Solo i job falliti o annullati possono essere ripresi")
+
+    queue = task.queue or "interactive"
+    await admit_job(db, task.owner_id, queue)
+    try:
+        reopened = await reopen_job(db, job_id)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Un job identico è già in corso")
+    if not reopened:
+        raise HTTPException(status_code=409, detail="Solo i job falliti o annullati possono essere ripresi")
+
+    priority = await fair_priority(db, task.owner_id)
+    try:
+        if task.type == "transcription":
+            params = task.params or {}
+            celery_id = await asyncio.to_thread(
+                start_transcription_job, job_id, task.audio_file_id, params.get("use_vad", False),
+                queue, priority, params.get("engine")
+            )
+        else:
+            async_result = await asyncio.to_thread(
+                summarize_transcript.apply_async, (job_id, task.transcript_id), queue=queue, priority=priority
+            )
+            celery_id = async_result.id
+    except Exception as e:
+        await update_job(job_id, status=TaskStatus.failed, error_message=str(e))
+        raise HTTPException(status_code=503, detail=f"Impossibile riaccodare il job: {str(e)}")
+
+    await update_job(job_id, celery_id=celery_id)
+    return {"message": "Job ripreso", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+
+# ⭐ ANNULLAMENTO: il lavoro in coda viene revocato, quello in esecuzione si ferma al prossimo chunk
+@router.delete("/jobs/{job_id}")
+async def delete_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    task = await get_job(db, job_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+
+    if not await cancel_job(db, job_id):
+        raise HTTPException(status_code=409, detail="Il job è già terminato")
+
+    if task.celery_id:
+        # Per le trascrizioni sono tutti i task del chain: anche transcodifica e divisione ancora in coda
+        celery_ids = task.celery_id.split(",")
+        try:
+            await asyncio.to_thread(celery.control.revoke, celery_ids)
+        except Exception as e:
+            # La revoca è un'ottimizzazione: i task controllano comunque lo stato del job
+            print(f"⚠️ Revoca dei task Celery {task.celery_id} non riuscita: {e}")
+
+    return job_to_dict(await get_job(db, job_id))
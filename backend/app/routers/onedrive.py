@@ -13,6 +13,8 @@ from app.models.transcription_summaries import TranscriptionSummary
 from app.models.audio_files import AudioFile
 from app.utils.post_processing import convert_html_to_word_template
 from app.utils.session_manager import SessionManager
+from app.services.blob_store import blob_store
+from app.services.admission import admission_lease
 
 # Crea il router con prefisso
 router = APIRouter(prefix="/onedrive", tags=["onedrive"])
@@ -204,7 +206,7 @@ async def test_onedrive_connection(request: Request):
         print(f"❌ Traceback completo: {traceback.format_exc()}")
         return {"status": "error", "message": f"Eccezione test: {str(e)}"}
 
-@router.post("/upload/transcription/{transcript_id}")
+@router.post("/upload/transcription/{transcript_id}", dependencies=[Depends(admission_lease)])
 async def upload_transcription_to_onedrive(
     transcript_id: int, 
     request: Request,
@@ -278,7 +280,7 @@ async def upload_transcription_to_onedrive(
         print(f"❌ Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Errore generale: {str(e)}")
 
-@router.post("/upload/summary/{summary_id}")
+@router.post("/upload/summary/{summary_id}", dependencies=[Depends(admission_lease)])
 async def upload_summary_to_onedrive(
     summary_id: int, 
     request: Request,
@@ -371,7 +373,7 @@ async def upload_summary_to_onedrive(
         print(f"❌ Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Errore generale: {str(e)}")
 
-@router.post("/upload/audio/{audio_id}")
+@router.post("/upload/audio/{audio_id}", dependencies=[Depends(admission_lease)])
 async def upload_audio_to_onedrive(
     audio_id: int, 
     request: Request,
@@ -395,16 +397,18 @@ async def upload_audio_to_onedrive(
         if not audio:
             raise HTTPException(status_code=404, detail="File audio non trovato")
             
-        print(f"✅ File audio trovato: {audio.file_name}, {len(audio.file_data)} bytes")
+        print(f"✅ File audio trovato: {audio.file_name}, {audio.size_bytes} bytes")
         
-        # Carica su OneDrive
+        # Carica su OneDrive leggendo il blob in streaming
         try:
-            result = onedrive_service.upload_file(
-                user_id, 
-                audio.file_name, 
-                audio.file_data, 
-                "Modello231/Audio"
-            )
+            with blob_store.open(audio.blob_key) as audio_stream:
+                result = onedrive_service.upload_file(
+                    user_id, 
+                    audio.file_name, 
+                    audio_stream, 
+                    "Modello231/Audio",
+                    file_size=audio.size_bytes
+                )
             
             print(f"✅ Upload audio completato: {result.get('name')}")
             
@@ -414,7 +418,7 @@ async def upload_audio_to_onedrive(
                 "file_id": result.get("id"),
                 "file_name": result.get("name"),
                 "web_url": result.get("webUrl"),
-                "size": len(audio.file_data)
+                "size": audio.size_bytes
             }
             
         except Exception as upload_error:
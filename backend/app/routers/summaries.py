@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import FileResponse
+import asyncio
+from functools import partial
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import update
@@ -8,8 +11,13 @@ from app.models.transcription_summaries import TranscriptionSummary
 from pydantic import BaseModel
 from app.routers.websocket_manager import websocket_manager;
 from app.models.transcripts import Transcript
-from app.models.transcription_summaries import TranscriptionSummary
-from app.services.summarizer import generate_summary
+from app.models.tasks import TaskStatus
+from app.models.summary_llm_calls import SummaryLLMCall
+from app.services.admission import admit_job, admission_lease
+from app.services.jobs import create_job, update_job, choose_queue, fair_priority, IdempotencyKeyConflict
+from app.services.summarizer import summary_cache_key
+from app.tasks.summary_tasks import summarize_transcript
+from app.utils.session_manager import SessionManager
 from app.utils.post_processing import parse_summary_sections, compile_summary_docx
 from datetime import datetime
 from docx import Document
@@ -19,41 +27,82 @@ router = APIRouter()
 class SummaryUpdateRequest(BaseModel):
     summary_text: str
 
-# API che genera il riassunto della trascrizione
-@router.post("/summary/start/{transcript_id}")
-async def summarize_transcription(transcript_id: int, db: AsyncSession = Depends(get_db)):
-    try: 
-        result = await db.execute(select(Transcript).filter(Transcript.id == transcript_id))
-        transcript = result.scalar_one_or_none()
-
-        if not transcript:
-            print(f"Trascrizione con ID {transcript_id} non trovata nel database.")
-            raise HTTPException(status_code=404, detail="Trascrizione non trovata")
-
-        if not transcript.transcript_text:
-            raise HTTPException(status_code=400, detail="Testo della trascrizione mancante")
-
-        summary = generate_summary(transcript.transcript_text)
-                
-        try:
-
-            new_summary = TranscriptionSummary(
+# ⭐ AVVIO ASINCRONO: il riassunto gira sui worker Celery, l'API risponde subito con l'id del job.
+# Richieste ripetute (stessa Idempotency-Key) o identiche a un job in corso restituiscono quel job.
+# Se la trascrizione non è cambiata dall'ultimo riassunto (stessi prompt, modello e parametri)
+# risponde subito 200 con quel riassunto, senza chiamare il modello.
+@router.post("/summary/start/{transcript_id}", status_code=202, dependencies=[Depends(admission_lease)])
+async def summarize_transcription(
+    transcript_id: int,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(select(Transcript).filter(Transcript.id == transcript_id))
+    transcript = result.scalar_one_or_none()
+
+    if not transcript:
+        print(f"Trascrizione con ID {transcript_id} non trovata nel database.")
+        raise HTTPException(status_code=404, detail="Trascrizione non trovata")
+
+    if not transcript.transcript_text:
+        raise HTTPException(status_code=400, detail="Testo della trascrizione mancante")
+
+    cache_key = summary_cache_key(transcript.transcript_text)
+    result = await db.execute(
+        select(TranscriptionSummary.id)
+        .filter(TranscriptionSummary.transcript_id == transcript_id, TranscriptionSummary.cache_key == cache_key)
+        .order_by(TranscriptionSummary.id.desc())
+        .limit(1)
+    )
+    cached_summary_id = result.scalar_one_or_none()
+    if cached_summary_id:
+        print(f"💾 Riassunto {cached_summary_id} riutilizzato per la trascrizione {transcript_id}")
+        return JSONResponse(status_code=200, content={
+            "message": "Riassunto già disponibile",
+            "job_id": None,
+            "summary_id": cached_summary_id,
+            "transcript_id": transcript_id,
+            "cached": True
+        })
+
+    owner_id = SessionManager.get_onedrive_user_id(request)
+    queue = choose_queue("summary", None)
+    priority = await fair_priority(db, owner_id)
+    try:
+        job, created = await create_job(
+            db, "summary",
+            idempotency_key=idempotency_key,
+            dedup_key=f"summary:{transcript_id}:{cache_key}",
+            audio_file_id=transcript.audio_id,
             transcript_id=transcript_id,
-            summary_text=summary,
-            created_at=datetime.utcnow()
+            owner_id=owner_id,
+            queue=queue,
+            admit=partial(admit_job, db, owner_id, queue)
+        )
+    except IdempotencyKeyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key già usata per una richiesta diversa")
+
+    if created:
+        try:
+            async_result = await asyncio.to_thread(
+                summarize_transcript.apply_async, (job.id, transcript_id), queue=queue, priority=priority
             )
-
-            db.add(new_summary)
-            await db.commit()
-            await db.refresh(new_summary)
         except Exception as e:
-            print(f"❌ Errore durante il processo: {e}")
+            print(f"❌ Eccezione nell'endpoint summary/start/ : {e}")
+            await update_job(job.id, status=TaskStatus.failed, error_message=str(e))
+            raise HTTPException(status_code=503, detail=f"Impossibile accodare il riassunto: {str(e)}")
+
+        await update_job(job.id, celery_id=async_result.id)
 
-        return new_summary.id
-    
-    except Exception as e:
-        print(f"❌ Eccezione nell'endpoint summary/start/ : {e}")
-        raise HTTPException(status_code=500, detail=f"Errore durante il riassunto: {str(e)}")
+    return {
+        "message": "Riassunto avviato" if created else "Riassunto già avviato",
+        "job_id": job.id,
+        "transcript_id": transcript_id,
+        "deduplicated": not created,
+        "cached": False,
+        "status_url": f"/jobs/{job.id}"
+    }
 
 
 
@@ -76,6 +125,36 @@ async def get_summary(summary_id: int, db: AsyncSession = Depends(get_db)):
     }
 
 
+# Consumi dei riassunti di una trascrizione: token e tempi di ogni chiamata, con i totali per job
+@router.get("/summary/usage/{transcript_id}")
+async def get_summary_usage(transcript_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(SummaryLLMCall)
+        .filter(SummaryLLMCall.transcript_id == transcript_id)
+        .order_by(SummaryLLMCall.id)
+    )
+    jobs = {}
+    for call in result.scalars().all():
+        job = jobs.setdefault(call.task_id, {
+            "job_id": call.task_id, "prompt_tokens": 0, "completion_tokens": 0, "calls": []
+        })
+        job["prompt_tokens"] += call.prompt_tokens
+        job["completion_tokens"] += call.completion_tokens
+        job["calls"].append({
+            "phase": call.phase,
+            "window_index": call.window_index,
+            "model": call.model,
+            "max_tokens": call.max_tokens,
+            "prompt_tokens": call.prompt_tokens,
+            "completion_tokens": call.completion_tokens,
+            "ttft_seconds": call.ttft_seconds,
+            "latency_seconds": call.latency_seconds,
+            "created_at": call.created_at
+        })
+
+    return {"transcript_id": transcript_id, "jobs": list(jobs.values())}
+
+
 
 
 
@@ -1,10 +1,11 @@
-import aiohttp
+import asyncio
 import io
-import os
-import tempfile
+import json
 import traceback  # ⭐ AGGIUNGI QUESTO
+from functools import partial
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -12,13 +13,18 @@ from sqlalchemy import update
 from app.database import get_db
 from app.models.audio_files import AudioFile
 from app.models.transcripts import Transcript
-from app.models.tasks import Task, TaskStatus
+from app.models.transcription_summaries import TranscriptionSummary
+from app.models.tasks import TaskStatus
 from pydantic import BaseModel
 from app.routers.websocket_manager import websocket_manager
-from app.utils.post_processing import format_segments_html, convert_html_to_word, convert_html_to_word_template
-from app.services.transcriber import transcribe_audio
-from fastapi import UploadFile
-from pydub import AudioSegment
+from app.utils.session_manager import SessionManager
+from app.utils.post_processing import convert_html_to_word_template
+from app.services.vad import VAD_ENABLED
+from app.services.admission import admit_job, admission_lease
+from app.services.jobs import create_job, update_job, choose_queue, fair_priority, IdempotencyKeyConflict
+from app.services.transcription_engines import get_engine
+from app.services.transcription_cache import transcription_cache
+from app.tasks.transcription_tasks import start_transcription_job
 
 router = APIRouter()
 
@@ -53,6 +59,13 @@ async def update_transcription(transcript_id: int, request: TranscriptUpdateRequ
     if not transcription:
         raise HTTPException(status_code=404, detail="Trascrizione non trovata")
 
+    if request.transcript_text != transcription.transcript_text:
+        # Testo modificato: i riassunti esistenti non sono più riutilizzabili dalla cache
+        await db.execute(
+            update(TranscriptionSummary)
+            .where(TranscriptionSummary.transcript_id == transcript_id)
+            .values(cache_key=None)
+        )
     stmt = update(Transcript).where(Transcript.id == transcript_id).values(transcript_text=request.transcript_text)
     await db.execute(stmt)
     await db.commit()
@@ -60,135 +73,115 @@ async def update_transcription(transcript_id: int, request: TranscriptUpdateRequ
     return {"message": "Trascrizione aggiornata con successo!"}
 
 
-# ⭐ ENDPOINT CON BETTER ERROR HANDLING
-@router.post("/start-transcription/{audio_file_id}")
-async def start_transcription_endpoint(audio_file_id: int, db: AsyncSession = Depends(get_db)):
+# ⭐ AVVIO ASINCRONO: la trascrizione gira sui worker Celery, l'API risponde subito con l'id del job.
+# Richieste ripetute (stessa Idempotency-Key) o identiche a un job in corso restituiscono quel job.
+# Un audio già trascritto con gli stessi parametri viene servito dalla cache senza passare dai worker.
+@router.post("/start-transcription/{audio_file_id}", status_code=202, dependencies=[Depends(admission_lease)])
+async def start_transcription_endpoint(
+    audio_file_id: int,
+    request: Request,
+    vad: Optional[bool] = None,
+    engine: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_db)
+):
+    print(f"🎬 Avvio trascrizione per audio_file_id: {audio_file_id}")
+
+    result = await db.execute(
+        select(AudioFile.id, AudioFile.blob_key, AudioFile.duration_seconds).filter(AudioFile.id == audio_file_id)
+    )
+    audio = result.one_or_none()
+    if audio is None:
+        print(f"❌ File audio con ID {audio_file_id} non trovato nel database.")
+        raise HTTPException(status_code=404, detail="File audio non trovato")
+
     try:
-        print(f"🎬 Avvio trascrizione per audio_file_id: {audio_file_id}")
-        
-        # Cerca il file audio nel database
-        result = await db.execute(select(AudioFile).filter(AudioFile.id == audio_file_id))
-        audio_file = result.scalar_one_or_none()
-
-        if not audio_file:
-            print(f"❌ File audio con ID {audio_file_id} non trovato nel database.")
-            raise HTTPException(status_code=404, detail="File audio non trovato")
-        
-        print(f"✅ File trovato: {audio_file.file_name}, dimensione: {len(audio_file.file_data)} bytes")
-        
-        # ⭐ CONTROLLO DIMENSIONE FILE
-        file_size_mb = len(audio_file.file_data) / (1024 * 1024)
-        print(f"📊 Dimensione file: {file_size_mb:.2f} MB")
-        
-        if file_size_mb > 25:  # Limite OpenAI Whisper
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File troppo grande ({file_size_mb:.2f} MB). Limite: 25 MB"
-            )
+        transcription_engine = get_engine(engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    owner_id = SessionManager.get_onedrive_user_id(request)
+    queue = choose_queue("transcription", audio.duration_seconds)
+    priority = await fair_priority(db, owner_id)
+
+    use_vad = VAD_ENABLED if vad is None else vad
+    dedup_key = f"transcription:{audio_file_id}:{transcription_engine.model_id}:vad={int(use_vad)}"
+    cached = None
+    file_key = None
+    if audio.blob_key:
+        file_key = transcription_cache.make_file_key(audio.blob_key, use_vad, transcription_engine)
+        # Il hit si conta solo se il risultato viene usato (job nuovo, non agganciato a uno esistente)
+        cached = await transcription_cache.lookup(file_key)
 
-        # ⭐ CONVERSIONE CON TRY/CATCH
-        print("🔄 Inizio conversione audio...")
-        temp_path = None
+    try:
+        job, created = await create_job(
+            db, "transcription",
+            idempotency_key=idempotency_key,
+            dedup_key=dedup_key,
+            audio_file_id=audio_file_id,
+            params={"use_vad": use_vad, "engine": transcription_engine.name},
+            owner_id=owner_id,
+            queue=queue,
+            # Un risultato in cache non occupa i worker: nessun controllo di ammissione
+            admit=None if cached else partial(admit_job, db, owner_id, queue)
+        )
+    except IdempotencyKeyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key già usata per una richiesta diversa")
+
+    if created and cached:
+        await transcription_cache.record_hit(file_key)
+        new_transcript = Transcript(
+            audio_id=audio_file_id,
+            transcript_text=cached["transcription"],
+            segments=cached["segments"],
+            created_at=datetime.utcnow()
+        )
+        db.add(new_transcript)
+        await db.commit()
+        await update_job(
+            job.id,
+            status=TaskStatus.completed,
+            transcript_id=new_transcript.id,
+            result=json.dumps({
+                "transcript_id": new_transcript.id,
+                "segments_count": len(cached["segments"]),
+                "chunks_count": 0,
+                "audio_file_id": audio_file_id,
+                "cached": True,
+            })
+        )
+        print(f"💾 Trascrizione servita dalla cache: job {job.id}, transcript {new_transcript.id}")
+    elif created:
         try:
-            original = AudioSegment.from_file(io.BytesIO(audio_file.file_data))
-            print(f"✅ Audio caricato: {len(original)}ms, {original.frame_rate}Hz")
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                # ⭐ CONVERSIONE PIÙ SICURA
-                converted = original.set_channels(1).set_frame_rate(16000)
-                converted.export(temp_file.name, format="mp3", bitrate="64k")
-                temp_path = temp_file.name
-                
-            print(f"✅ Conversione completata: {temp_path}")
-            
-            # ⭐ CONTROLLO DIMENSIONE FILE CONVERTITO
-            converted_size = os.path.getsize(temp_path)
-            print(f"📊 File convertito: {converted_size / (1024*1024):.2f} MB")
-
-        except Exception as conv_error:
-            print(f"❌ Errore conversione audio: {str(conv_error)}")
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Errore nella conversione audio: {str(conv_error)}"
+            celery_id = await asyncio.to_thread(
+                start_transcription_job, job.id, audio_file_id, use_vad, queue, priority,
+                transcription_engine.name
             )
-
-        # ⭐ TRASCRIZIONE CON TIMEOUT E RETRY
-        print("🎤 Inizio trascrizione...")
-        try:
-            result_json = await transcribe_audio(temp_path)
-            print(f"✅ Trascrizione completata, chiavi risultato: {list(result_json.keys())}")
-            
-        except Exception as transcr_error:
-            print(f"❌ Errore trascrizione: {str(transcr_error)}")
+        except Exception as e:
+            print(f"❌ Errore accodamento trascrizione: {str(e)}")
             print(f"❌ Traceback: {traceback.format_exc()}")
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Errore nella trascrizione: {str(transcr_error)}"
-            )
-        
-        finally:
-            # ⭐ PULIZIA FILE TEMPORANEO
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-                print(f"🗑️ File temporaneo rimosso: {temp_path}")
-
-        # ⭐ VALIDAZIONE RISULTATO
-        raw_transcription = result_json.get("transcription")
-        segments = result_json.get("segments", [])
-        
-        if not raw_transcription:
-            print(f"❌ Trascrizione vuota nel risultato: {result_json}")
-            raise HTTPException(status_code=500, detail="Trascrizione vuota dalla API")
-
-        print(f"✅ Trascrizione ottenuta: {len(raw_transcription)} caratteri, {len(segments)} segmenti")
-
-        # ⭐ SALVATAGGIO NEL DB CON TRY/CATCH
-        try:
-            new_transcript = Transcript(
-                audio_id=audio_file.id,
-                transcript_text=raw_transcription,
-                segments=segments,
-                created_at=datetime.utcnow()
-            )
-            db.add(new_transcript)
-            await db.commit()
-            await db.refresh(new_transcript)
-            print(f"✅ Transcript salvato con ID: {new_transcript.id}")
+            await update_job(job.id, status=TaskStatus.failed, error_message=str(e))
+            raise HTTPException(status_code=503, detail=f"Impossibile accodare la trascrizione: {str(e)}")
 
-        except Exception as db_error:
-            print(f"❌ Errore salvataggio DB: {str(db_error)}")
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            await db.rollback()
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Errore nel salvataggio: {str(db_error)}"
-            )
+        await update_job(job.id, celery_id=celery_id)
+        print(f"🆔 Job di trascrizione accodato: {job.id} (celery {celery_id}, coda {queue}, priorità {priority})")
+    else:
+        print(f"🔁 Richiesta agganciata al job di trascrizione esistente: {job.id}")
 
-        # ✅ Successo
-        return {
-            "message": "Trascrizione completata con successo!",
-            "transcript_id": new_transcript.id,
-            "audio_file_id": audio_file.id,
-            "transcript_length": len(raw_transcription),
-            "segments_count": len(segments)
-        }
-        
-    except HTTPException:
-        # Re-raise HTTPExceptions (already handled)
-        raise
-    except Exception as e:
-        # ⭐ CATCH ALL PER ERRORI IMPREVISTI
-        print(f"❌ Errore imprevisto: {str(e)}")
-        print(f"❌ Traceback completo: {traceback.format_exc()}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Errore imprevisto durante la trascrizione: {str(e)}"
-        )
+    return {
+        "message": "Trascrizione avviata" if created else "Trascrizione già avviata",
+        "job_id": job.id,
+        "audio_file_id": audio_file_id,
+        "deduplicated": not created,
+        "cached": bool(created and cached),
+        "status_url": f"/jobs/{job.id}"
+    }
+
+
+# Statistiche della cache dei risultati di trascrizione: occupazione, hit, tempo e costo risparmiati
+@router.get("/transcription-cache/stats")
+async def transcription_cache_stats():
+    return await transcription_cache.stats()
 
 
 # API che converte la trascrizione in word e fa partire il download
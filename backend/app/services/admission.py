@@ -0,0 +1,148 @@
+import os
+import time
+import uuid
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from app.services.jobs import count_in_flight
+from app.utils.metrics import metrics
+from app.utils.session_manager import SessionManager
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Richieste costose contemporanee (avvio job, upload OneDrive), su tutti i processi API
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_MAX_CONCURRENT_PER_USER = int(os.getenv("ADMISSION_MAX_CONCURRENT_PER_USER", "4"))
+# Job in coda o in esecuzione
+ADMISSION_MAX_JOBS = int(os.getenv("ADMISSION_MAX_JOBS", "200"))
+ADMISSION_MAX_JOBS_PER_USER = int(os.getenv("ADMISSION_MAX_JOBS_PER_USER", "10"))
+# Messaggi in attesa su una coda Celery oltre i quali si rifiutano nuovi job
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "1000"))
+
+# Un lease non rilasciato (processo caduto) scade da solo
+ADMISSION_LEASE_SECONDS = int(os.getenv("ADMISSION_LEASE_SECONDS", "600"))
+# Retry-After suggerito: breve per le richieste, più lungo quando sono pieni i worker
+REQUEST_RETRY_AFTER_SECONDS = 5
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "30"))
+
+LEASE_KEY = "admission:requests"
+
+# Pulizia dei lease scaduti, controllo dei limiti e acquisizione in un solo passaggio atomico
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then return 1 end
+if #KEYS > 1 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+    if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[5]) then return 2 end
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[6])
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return 0
+"""
+
+# Separatore delle sotto-code di priorità usato da kombu sul trasporto Redis
+_PRIORITY_SEP = "\x06\x16"
+
+
+def _reject(status_code: int, reason: str, detail: str, retry_after: int) -> HTTPException:
+    metrics.incr(f"admission.rejected.{reason}")
+    return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+class AdmissionController:
+    """
+    Controllo di ammissione condiviso tra i processi API (stato su Redis):
+    - lease per le richieste costose in corso, con budget globale e per utente;
+    - soglie sui job in corso e sulla profondità delle code Celery.
+    Le richieste in eccesso ricevono subito 429 (limite dell'utente) o 503
+    (sistema saturo) con Retry-After, invece di accumularsi fino al timeout.
+    Se Redis non risponde le richieste vengono ammesse.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis = aioredis.from_url(redis_url)
+        self._acquire = self.redis.register_script(_ACQUIRE_SCRIPT)
+
+    @asynccontextmanager
+    async def lease(self, owner_id: Optional[str]):
+        member = str(uuid.uuid4())
+        keys = [LEASE_KEY] + ([f"{LEASE_KEY}:user:{owner_id}"] if owner_id else [])
+        now = time.time()
+        acquired = False
+        try:
+            outcome = await self._acquire(
+                keys=keys,
+                args=[now, now + ADMISSION_LEASE_SECONDS, member,
+                      ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_CONCURRENT_PER_USER, ADMISSION_LEASE_SECONDS]
+            )
+            acquired = outcome == 0
+        except Exception as e:
+            logger.warning(f"⚠️ Controllo di ammissione non disponibile, richiesta ammessa: {e}")
+            outcome = 0
+
+        if outcome == 1:
+            raise _reject(503, "global", "Servizio momentaneamente sovraccarico, riprova più tardi",
+                          REQUEST_RETRY_AFTER_SECONDS)
+        if outcome == 2:
+            raise _reject(429, "user", "Troppe richieste contemporanee per questo utente",
+                          REQUEST_RETRY_AFTER_SECONDS)
+
+        metrics.incr("admission.admitted")
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    for key in keys:
+                        await self.redis.zrem(key, member)
+                except Exception as e:
+                    logger.warning(f"⚠️ Rilascio lease di ammissione non riuscito: {e}")
+
+    async def queue_depth(self, queue: str) -> int:
+        names = [queue] + [f"{queue}{_PRIORITY_SEP}{priority}" for priority in range(1, 10)]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.llen(name)
+            return sum(await pipe.execute())
+
+    async def check_job_admission(self, in_flight: int, in_flight_for_owner: Optional[int], queue: str) -> None:
+        """Rifiuta un nuovo job se l'utente o il sistema hanno già troppo lavoro in coda."""
+        if in_flight_for_owner is not None and in_flight_for_owner >= ADMISSION_MAX_JOBS_PER_USER:
+            raise _reject(429, "user_jobs", "Troppi job in corso per questo utente", JOB_RETRY_AFTER_SECONDS)
+        if in_flight >= ADMISSION_MAX_JOBS:
+            raise _reject(503, "jobs", "Troppi job in corso, riprova più tardi", JOB_RETRY_AFTER_SECONDS)
+
+        try:
+            depth = await self.queue_depth(queue)
+        except Exception as e:
+            logger.warning(f"⚠️ Profondità della coda {queue} non disponibile: {e}")
+            return
+        metrics.gauge(f"admission.queue_depth.{queue}", depth)
+        if depth >= ADMISSION_MAX_QUEUE_DEPTH:
+            raise _reject(503, "queue_depth", f"Coda {queue} piena, riprova più tardi", JOB_RETRY_AFTER_SECONDS)
+
+
+# 🔹 Istanza globale del controllo di ammissione
+admission = AdmissionController(REDIS_URL)
+
+
+async def admit_job(db, owner_id: Optional[str], queue: str) -> None:
+    """Controllo di ammissione di un nuovo job, con i conteggi dei job in corso dal DB."""
+    in_flight = await count_in_flight(db)
+    in_flight_for_owner = await count_in_flight(db, owner_id) if owner_id else None
+    await admission.check_job_admission(in_flight, in_flight_for_owner, queue)
+
+
+async def admission_lease(request: Request):
+    """Dipendenza FastAPI: tiene un lease di ammissione per tutta la durata della richiesta."""
+    async with admission.lease(SessionManager.get_onedrive_user_id(request)):
+        yield
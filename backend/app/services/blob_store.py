@@ -0,0 +1,158 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Backend di storage: per ora solo "local", in futuro anche uno S3-compatibile
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", os.path.join(os.getcwd(), "storage", "blobs"))
+
+# Dimensione fissa dei blocchi letti/scritti in streaming (1 MB)
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", str(1024 * 1024)))
+
+
+class BlobWriter:
+    """
+    Scrittura incrementale di un blob: i dati arrivano a blocchi, vengono
+    hashati al volo e solo al commit il blob riceve la sua chiave (SHA-256).
+    """
+
+    def write(self, chunk: bytes) -> None:
+        raise NotImplementedError
+
+    def commit(self) -> Tuple[str, int]:
+        """Finalizza il blob e restituisce (chiave, dimensione in byte)."""
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        raise NotImplementedError
+
+
+class BlobStore:
+    """Interfaccia comune per gli storage dei file audio, indirizzati per contenuto."""
+
+    def open_writer(self) -> BlobWriter:
+        raise NotImplementedError
+
+    def open(self, key: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Percorso su disco del blob, se lo storage è locale (altrimenti None)."""
+        return None
+
+
+class LocalBlobWriter(BlobWriter):
+    def __init__(self, store: "LocalBlobStore"):
+        self.store = store
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.hasher.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> Tuple[str, int]:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+        key = self.hasher.hexdigest()
+        final_path = self.store._path(key)
+
+        if os.path.exists(final_path):
+            # Contenuto già presente: il blob esistente viene riutilizzato
+            os.remove(self.tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(self.tmp_path, final_path)
+
+        return key, self.size
+
+    def abort(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Storage su filesystem locale. I blob sono salvati come
+    <root>/<aa>/<bb>/<sha256> per non avere directory con troppi file.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def open_writer(self) -> BlobWriter:
+        return LocalBlobWriter(self)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+def get_blob_store() -> BlobStore:
+    if BLOB_STORE_BACKEND == "local":
+        return LocalBlobStore(BLOB_STORE_ROOT)
+    raise ValueError(f"Backend di storage non supportato: {BLOB_STORE_BACKEND}")
+
+
+# 🔹 Istanza globale dello storage
+blob_store = get_blob_store()
+
+
+async def store_upload(upload) -> Tuple[str, int]:
+    """
+    Salva un UploadFile nello storage leggendolo a blocchi di dimensione fissa:
+    la memoria usata resta costante qualunque sia la durata della registrazione.
+    """
+    writer = blob_store.open_writer()
+    try:
+        while True:
+            chunk = await upload.read(BLOB_CHUNK_SIZE)
+            if not chunk:
+                break
+            await asyncio.to_thread(writer.write, chunk)
+        return await asyncio.to_thread(writer.commit)
+    except BaseException:
+        await asyncio.to_thread(writer.abort)
+        raise
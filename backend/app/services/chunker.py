@@ -0,0 +1,138 @@
+import os
+import re
+import logging
+import subprocess
+from typing import Iterable, List, Tuple
+from dotenv import load_dotenv
+from app.services.transcoder import FFMPEG_BIN, run_ffmpeg
+from app.utils.media_probe import probe_media
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Limite di dimensione per singola richiesta all'API di trascrizione (25 MB per Whisper)
+MAX_CHUNK_BYTES = int(os.getenv("TRANSCRIPTION_MAX_CHUNK_BYTES", str(25 * 1024 * 1024)))
+# Margine di sicurezza rispetto al limite, per la variabilità del bitrate e gli header
+CHUNK_SIZE_SAFETY = 0.9
+
+# Parametri del rilevamento dei silenzi
+SILENCE_NOISE_DB = int(os.getenv("CHUNK_SILENCE_NOISE_DB", "-35"))
+SILENCE_MIN_SECONDS = float(os.getenv("CHUNK_SILENCE_MIN_SECONDS", "0.5"))
+# Un chunk non viene tagliato prima di questa frazione della durata massima
+MIN_CHUNK_FRACTION = 0.5
+
+_SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+def detect_silences(path: str, noise_db: int = SILENCE_NOISE_DB,
+                    min_silence: float = SILENCE_MIN_SECONDS) -> List[Tuple[float, float]]:
+    """
+    Rileva gli intervalli di silenzio con il filtro silencedetect di ffmpeg.
+    L'output viene letto riga per riga, quindi la memoria non dipende dalla durata.
+    """
+    cmd = [
+        FFMPEG_BIN, "-hide_banner", "-nostats", "-i", path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-"
+    ]
+    silences = []
+    current_start = None
+
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    for line in process.stderr:
+        match = _SILENCE_START.search(line)
+        if match:
+            current_start = max(float(match.group(1)), 0.0)
+            continue
+        match = _SILENCE_END.search(line)
+        if match and current_start is not None:
+            silences.append((current_start, float(match.group(1))))
+            current_start = None
+    process.wait()
+
+    if process.returncode != 0:
+        logger.warning(f"⚠️ silencedetect terminato con codice {process.returncode} su {path}")
+    return silences
+
+
+def plan_chunks(duration: float, silences: List[Tuple[float, float]],
+                max_chunk_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Divide [0, duration] in intervalli lunghi al massimo max_chunk_seconds,
+    tagliando al centro dell'ultimo silenzio utile di ogni finestra. Se nella
+    finestra non c'è silenzio il taglio avviene alla durata massima.
+    """
+    if duration <= max_chunk_seconds:
+        return [(0.0, duration)]
+
+    cut_points = [(start + end) / 2 for start, end in silences]
+    chunks = []
+    start = 0.0
+    while duration - start > max_chunk_seconds:
+        window_end = start + max_chunk_seconds
+        window_min = start + max_chunk_seconds * MIN_CHUNK_FRACTION
+        candidates = [p for p in cut_points if window_min <= p <= window_end]
+        cut = candidates[-1] if candidates else window_end
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, duration))
+    return chunks
+
+
+def plan_split(path: str, max_chunk_bytes: int = MAX_CHUNK_BYTES) -> List[Tuple[float, float]]:
+    """
+    Intervalli (inizio, fine) in cui dividere un file audio (già
+    transcodificato) per restare sotto il limite di dimensione, tagliando
+    sui silenzi.
+    """
+    size = os.path.getsize(path)
+    metadata = probe_media(path) or {}
+    duration = metadata.get("duration_seconds")
+    if not duration:
+        raise ValueError(f"Durata non disponibile per {path}")
+
+    if size <= max_chunk_bytes * CHUNK_SIZE_SAFETY:
+        return [(0.0, duration)]
+
+    bytes_per_second = size / duration
+    max_chunk_seconds = max_chunk_bytes * CHUNK_SIZE_SAFETY / bytes_per_second
+    plan = plan_chunks(duration, detect_silences(path), max_chunk_seconds)
+    logger.info(f"✂️ {path}: {duration:.0f}s divisi in {len(plan)} chunk (max {max_chunk_seconds:.0f}s)")
+    return plan
+
+
+def cut_chunks(path: str, output_dir: str, plan: List[Tuple[float, float]],
+               skip: Iterable[int] = ()) -> List[dict]:
+    """
+    Estrae i chunk del piano con copia dello stream, senza ricodifica.
+    I chunk in `skip` (già trascritti) non vengono estratti.
+    """
+    skip = set(skip)
+    if len(plan) == 1:
+        # Un solo chunk: il file stesso
+        start, end = plan[0]
+        return [] if 0 in skip else [{"chunk_number": 0, "path": path, "start": start, "end": end}]
+
+    extension = os.path.splitext(path)[1]
+    chunks = []
+    for number, (start, end) in enumerate(plan):
+        if number in skip:
+            continue
+        chunk_path = os.path.join(output_dir, f"chunk_{number:04d}{extension}")
+        run_ffmpeg(
+            ["-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", path],
+            ["-c", "copy"],
+            chunk_path
+        )
+        chunks.append({"chunk_number": number, "path": chunk_path, "start": start, "end": end})
+    return chunks
+
+
+def split_audio(path: str, output_dir: str, max_chunk_bytes: int = MAX_CHUNK_BYTES) -> List[dict]:
+    """
+    Divide un file audio (già transcodificato) in chunk sotto il limite di
+    dimensione, tagliando sui silenzi.
+    """
+    return cut_chunks(path, output_dir, plan_split(path, max_chunk_bytes))
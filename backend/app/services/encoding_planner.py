@@ -0,0 +1,123 @@
+import os
+import math
+import shutil
+import logging
+from dotenv import load_dotenv
+from app.services.blob_store import blob_store, BLOB_CHUNK_SIZE
+from app.services.chunker import MAX_CHUNK_BYTES, CHUNK_SIZE_SAFETY
+from app.services.transcoder import TARGET_CHANNELS, TARGET_SAMPLE_RATE
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Profili di codifica disponibili per l'audio inviato alla trascrizione
+ENCODING_PROFILES = {
+    "opus-32k": {"bitrate_kbps": 32, "extension": ".ogg",
+                 "output_args": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"]},
+    "opus-24k": {"bitrate_kbps": 24, "extension": ".ogg",
+                 "output_args": ["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"]},
+    "opus-16k": {"bitrate_kbps": 16, "extension": ".ogg",
+                 "output_args": ["-c:a", "libopus", "-b:a", "16k", "-application", "voip", "-f", "ogg"]},
+    "opus-12k": {"bitrate_kbps": 12, "extension": ".ogg",
+                 "output_args": ["-c:a", "libopus", "-b:a", "12k", "-application", "voip", "-f", "ogg"]},
+    "mp3-64k": {"bitrate_kbps": 64, "extension": ".mp3",
+                "output_args": ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"]},
+    "mp3-32k": {"bitrate_kbps": 32, "extension": ".mp3",
+                "output_args": ["-c:a", "libmp3lame", "-b:a", "32k", "-f", "mp3"]},
+}
+
+# Profili candidati in ordine di preferenza (qualità decrescente)
+TRANSCODE_PROFILES = [
+    name.strip() for name in os.getenv("TRANSCODE_PROFILES", "opus-32k,opus-24k,opus-16k,opus-12k").split(",")
+    if name.strip() in ENCODING_PROFILES
+]
+
+# Sorgenti che l'API di trascrizione accetta così come sono: codec ammessi e
+# contenitore ffprobe (format_name) -> estensione attesa dall'API
+PASSTHROUGH_CODECS = {"mp3", "opus", "vorbis", "flac", "aac"}
+PASSTHROUGH_CONTAINERS = {
+    "mp3": ".mp3",
+    "ogg": ".ogg",
+    "matroska,webm": ".webm",
+    "flac": ".flac",
+    "mov,mp4,m4a,3gp,3g2,mj2": ".m4a",
+}
+PASSTHROUGH_MAX_BITRATE = int(os.getenv("PASSTHROUGH_MAX_BITRATE", "64000"))
+
+# Overhead stimato del contenitore rispetto al bitrate nominale
+CONTAINER_OVERHEAD = 1.05
+
+
+def estimate_bytes(bitrate_kbps: float, duration_seconds: float) -> int:
+    return int(bitrate_kbps * 1000 / 8 * duration_seconds * CONTAINER_OVERHEAD)
+
+
+def plan_encoding(metadata: dict, size_bytes: int, force_transcode: bool = False) -> dict:
+    """
+    Sceglie come preparare l'audio per la trascrizione:
+    - "passthrough" se la sorgente è già mono, a 16 kHz o meno, con un codec
+      accettato dall'API e un bitrate contenuto: nessuna transcodifica;
+    - altrimenti il profilo di qualità più alta che sta in una sola richiesta
+      (un solo chunk); se nessuno ci sta, il profilo più leggero, che riduce
+      al minimo il numero di chunk e i byte trasferiti.
+    """
+    duration = metadata.get("duration_seconds")
+    budget = MAX_CHUNK_BYTES * CHUNK_SIZE_SAFETY
+
+    codec = metadata.get("codec")
+    extension = PASSTHROUGH_CONTAINERS.get(metadata.get("format_name"))
+    bit_rate = metadata.get("bit_rate") or (size_bytes * 8 / duration if duration else None)
+    if (
+        not force_transcode
+        and codec in PASSTHROUGH_CODECS
+        and extension is not None
+        and metadata.get("channels") == TARGET_CHANNELS
+        and (metadata.get("sample_rate") or 0) <= TARGET_SAMPLE_RATE
+        and bit_rate is not None and bit_rate <= PASSTHROUGH_MAX_BITRATE
+    ):
+        return {
+            "mode": "passthrough",
+            "profile": None,
+            "extension": extension,
+            "output_args": None,
+            "estimated_bytes": size_bytes,
+            "estimated_chunks": max(math.ceil(size_bytes / budget), 1),
+        }
+
+    if not duration:
+        # Senza durata non si può stimare: profilo preferito
+        name = TRANSCODE_PROFILES[0]
+    else:
+        fitting = [
+            name for name in TRANSCODE_PROFILES
+            if estimate_bytes(ENCODING_PROFILES[name]["bitrate_kbps"], duration) <= budget
+        ]
+        name = fitting[0] if fitting else min(
+            TRANSCODE_PROFILES, key=lambda n: ENCODING_PROFILES[n]["bitrate_kbps"]
+        )
+
+    profile = ENCODING_PROFILES[name]
+    estimated = estimate_bytes(profile["bitrate_kbps"], duration) if duration else None
+    return {
+        "mode": "transcode",
+        "profile": name,
+        "extension": profile["extension"],
+        "output_args": profile["output_args"],
+        "estimated_bytes": estimated,
+        "estimated_chunks": max(math.ceil(estimated / budget), 1) if estimated else None,
+    }
+
+
+def link_passthrough(blob_key: str, output_path: str) -> None:
+    """
+    Rende disponibile il blob originale con l'estensione attesa dall'API:
+    un link simbolico se lo storage è locale, altrimenti una copia a blocchi.
+    """
+    local_path = blob_store.local_path(blob_key)
+    if local_path:
+        os.symlink(local_path, output_path)
+        return
+
+    with blob_store.open(blob_key) as source, open(output_path, "wb") as target:
+        shutil.copyfileobj(source, target, BLOB_CHUNK_SIZE)
@@ -0,0 +1,168 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+JOB_CHANNEL_PREFIX = "jobs:"
+# Testo generato in streaming, conservato per chi si collega a generazione iniziata
+JOB_STREAM_TTL_SECONDS = 3600
+# Attesa massima tra due tentativi di riconnessione dell'ascolto
+LISTEN_RETRY_MAX_SECONDS = 30
+
+_publisher: Optional[aioredis.Redis] = None
+
+
+async def publish_job_update(snapshot: dict) -> None:
+    """Pubblica lo stato aggiornato di un job: lo ricevono tutti i processi API in ascolto."""
+    global _publisher
+    if _publisher is None:
+        _publisher = aioredis.from_url(REDIS_URL)
+    try:
+        await _publisher.publish(f"{JOB_CHANNEL_PREFIX}{snapshot['job_id']}", json.dumps(snapshot, default=str))
+    except Exception as e:
+        # Le notifiche sono best effort: chi attende rilegge comunque il DB allo scadere del timeout
+        logger.warning(f"⚠️ Pubblicazione aggiornamento job non riuscita: {e}")
+
+
+def _stream_key(job_id: int) -> str:
+    return f"{JOB_CHANNEL_PREFIX}{job_id}:stream"
+
+
+async def publish_job_delta(job_id: int, offset: int, text: str, full_text: str) -> None:
+    """
+    Pubblica un frammento del testo che il job sta generando, a partire dal
+    carattere `offset` (0 = il testo riparte da capo, es. dopo un nuovo
+    tentativo). Su Redis si salva `full_text`, il testo completo fin qui, per
+    chi si collega dopo: gli offset sono in caratteri, non in byte UTF-8, e
+    un SETRANGE sovrascriverebbe il testo con lettere accentate.
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = aioredis.from_url(REDIS_URL)
+    try:
+        async with _publisher.pipeline(transaction=True) as pipe:
+            pipe.set(_stream_key(job_id), full_text, ex=JOB_STREAM_TTL_SECONDS)
+            pipe.publish(
+                f"{JOB_CHANNEL_PREFIX}{job_id}",
+                json.dumps({"type": "delta", "job_id": job_id, "offset": offset, "text": text})
+            )
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Pubblicazione testo in streaming non riuscita: {e}")
+
+
+async def read_job_stream(job_id: int) -> str:
+    """Testo generato finora dal job (vuoto se non disponibile)."""
+    global _publisher
+    if _publisher is None:
+        _publisher = aioredis.from_url(REDIS_URL)
+    try:
+        text = await _publisher.get(_stream_key(job_id))
+        return text.decode("utf-8", errors="replace") if text else ""
+    except Exception as e:
+        logger.warning(f"⚠️ Lettura testo in streaming non riuscita: {e}")
+        return ""
+
+
+class JobStreamWriter:
+    """
+    Raccoglie i frammenti generati da un job e li pubblica a blocchi (al più
+    uno ogni `interval` secondi), per non inviare un messaggio per token.
+    """
+
+    def __init__(self, job_id: int, interval: float = 0.1):
+        self.job_id = job_id
+        self.interval = interval
+        self._text = ""  # testo generato finora, frammenti in attesa compresi
+        self._offset = 0  # inizio dei frammenti non ancora pubblicati
+        self._last_flush = 0.0
+
+    async def write(self, offset: int, text: str) -> None:
+        if offset != len(self._text):
+            # Il testo riparte da un altro punto (nuovo tentativo): prima si invia quanto raccolto
+            await self.flush()
+            self._text = self._text[:offset]
+            self._offset = offset
+        self._text += text
+        if asyncio.get_running_loop().time() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._last_flush = asyncio.get_running_loop().time()
+        if self._offset == len(self._text):
+            return
+        await publish_job_delta(self.job_id, self._offset, self._text[self._offset:], self._text)
+        self._offset = len(self._text)
+
+
+class JobEventHub:
+    """
+    Un'unica sottoscrizione Redis per processo API (pattern jobs:*), che
+    smista gli aggiornamenti (stati e frammenti di testo in streaming) alle
+    code dei client in attesa. Migliaia di
+    client in long-poll o SSE costano una coda in memoria ciascuno, non una
+    connessione Redis o una query periodica al DB.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, job_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=100)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, job_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(job_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[job_id]
+
+    async def _listen(self) -> None:
+        # Un errore di Redis non chiude l'ascolto: i client già collegati resterebbero senza aggiornamenti
+        attempt = 0
+        while True:
+            client = aioredis.from_url(REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{JOB_CHANNEL_PREFIX}*")
+                attempt = 0
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    snapshot = json.loads(message["data"])
+                    for queue in list(self._subscribers.get(snapshot["job_id"], ())):
+                        if queue.full():
+                            # Client lento: conta solo l'ultimo stato (i frammenti persi si recuperano da Redis)
+                            queue.get_nowait()
+                        queue.put_nowait(snapshot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Ascolto aggiornamenti job interrotto: {e}")
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+            # Backoff esponenziale tra i tentativi di riconnessione
+            await asyncio.sleep(min(LISTEN_RETRY_MAX_SECONDS, 0.5 * 2 ** attempt))
+            attempt += 1
+
+
+# 🔹 Istanza globale per la distribuzione degli aggiornamenti dei job
+job_event_hub = JobEventHub()
@@ -0,0 +1,283 @@
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+from app.database import AsyncSessionLocal
+from app.models.tasks import Task, TaskStatus
+from app.services.job_events import publish_job_update
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Code Celery: i job brevi vanno su "interactive", le registrazioni lunghe su "bulk"
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
+JOB_INTERACTIVE_MAX_SECONDS = float(os.getenv("JOB_INTERACTIVE_MAX_SECONDS", str(30 * 60)))
+# Priorità dei messaggi sul broker Redis: 0 è la più alta
+MAX_JOB_PRIORITY = 9
+
+# Fasce di avanzamento (percentuale di inizio, percentuale di fine) di ogni fase, per tipo di job
+STAGE_RANGES = {
+    "transcription": {
+        "queued": (0, 0),
+        "transcoding": (0, 20),
+        "splitting": (20, 25),
+        "transcribing": (25, 95),
+        "persisting": (95, 100),
+    },
+    "summary": {
+        "queued": (0, 0),
+        "summarizing": (0, 95),
+        "persisting": (95, 100),
+    },
+}
+
+TERMINAL_STATUSES = {TaskStatus.completed, TaskStatus.failed, TaskStatus.cancelled}
+IN_FLIGHT_STATUSES = (TaskStatus.pending, TaskStatus.processing)
+
+
+class JobCancelled(Exception):
+    """Il job è stato annullato: i task ancora in coda o in esecuzione si fermano."""
+
+
+class IdempotencyKeyConflict(Exception):
+    """La stessa Idempotency-Key è già stata usata per una richiesta diversa."""
+
+
+def job_to_dict(task: Task) -> dict:
+    try:
+        result = json.loads(task.result) if task.result else None
+    except json.JSONDecodeError:
+        result = task.result
+
+    return {
+        "job_id": task.id,
+        "type": task.type,
+        "status": task.status.value,
+        "stage": task.stage,
+        "progress": round(task.progress or 0.0, 1),
+        "steps_done": task.steps_done,
+        "steps_total": task.steps_total,
+        "eta_seconds": task.eta_seconds,
+        "stages": task.stages or {},
+        "result": result,
+        "error_message": task.error_message,
+        "queue": task.queue,
+        "audio_file_id": task.audio_file_id,
+        "transcript_id": task.transcript_id,
+        "version": task.version,
+        "created_at": task.created_at,
+        "started_at": task.started_at,
+        "updated_at": task.updated_at,
+        "finished_at": task.finished_at,
+    }
+
+
+def _progress(task: Task) -> float:
+    start, end = STAGE_RANGES.get(task.type, {}).get(task.stage, (task.progress or 0, task.progress or 0))
+    if task.steps_total:
+        return start + (end - start) * min(task.steps_done / task.steps_total, 1.0)
+    return start
+
+
+def _eta(task: Task, now: datetime) -> Optional[float]:
+    if not task.started_at or not task.progress or task.progress >= 100:
+        return None
+    elapsed = (now - task.started_at).total_seconds()
+    return elapsed / task.progress * (100 - task.progress)
+
+
+async def get_job(db, job_id: int) -> Optional[Task]:
+    result = await db.execute(select(Task).filter(Task.id == job_id))
+    return result.scalar_one_or_none()
+
+
+def choose_queue(type: str, duration_seconds: Optional[float]) -> str:
+    """Le trascrizioni lunghe (o di durata ignota) vanno in coda bulk, il resto in interactive."""
+    if type == "transcription" and (duration_seconds is None or duration_seconds > JOB_INTERACTIVE_MAX_SECONDS):
+        return BULK_QUEUE
+    return INTERACTIVE_QUEUE
+
+
+async def count_in_flight(db, owner_id: Optional[str] = None) -> int:
+    """Job in coda o in esecuzione, di tutti gli utenti o del solo `owner_id`."""
+    query = select(func.count(Task.id)).filter(Task.status.in_(IN_FLIGHT_STATUSES))
+    if owner_id:
+        query = query.filter(Task.owner_id == owner_id)
+    result = await db.execute(query)
+    return result.scalar_one()
+
+
+async def fair_priority(db, owner_id: Optional[str]) -> int:
+    """
+    Priorità del nuovo job in base ai job già in corso dello stesso utente:
+    chi ha meno lavoro in coda passa avanti, così un utente che accoda
+    decine di importazioni non blocca gli altri.
+    """
+    if not owner_id:
+        return MAX_JOB_PRIORITY // 2
+    return min(await count_in_flight(db, owner_id), MAX_JOB_PRIORITY)
+
+
+async def is_cancelled(job_id: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Task.status).filter(Task.id == job_id))
+        return result.scalar_one_or_none() == TaskStatus.cancelled
+
+
+async def cancel_job(db, job_id: int) -> bool:
+    """
+    Segna il job come annullato, se non è già terminato. I worker controllano
+    lo stato prima di ogni fase e di ogni chunk; gli aggiornamenti successivi
+    all'annullamento vengono ignorati.
+    """
+    result = await db.execute(
+        update(Task)
+        .where(Task.id == job_id, Task.status.in_(IN_FLIGHT_STATUSES))
+        .values(status=TaskStatus.cancelled, version=Task.version + 1,
+                finished_at=datetime.utcnow(), eta_seconds=None)
+    )
+    await db.commit()
+    if result.rowcount == 0:
+        return False
+
+    task = await get_job(db, job_id)
+    await db.refresh(task)
+    await publish_job_update(job_to_dict(task))
+    return True
+
+
+async def find_existing_job(db, type: str, idempotency_key: Optional[str], dedup_key: Optional[str]) -> Optional[Task]:
+    if idempotency_key:
+        result = await db.execute(
+            select(Task).filter(Task.type == type, Task.idempotency_key == idempotency_key)
+        )
+        existing = result.scalar_one_or_none()
+        if existing:
+            if existing.dedup_key != dedup_key:
+                raise IdempotencyKeyConflict(idempotency_key)
+            return existing
+
+    if dedup_key:
+        result = await db.execute(
+            select(Task).filter(Task.dedup_key == dedup_key, Task.status.in_(IN_FLIGHT_STATUSES))
+        )
+        return result.scalar_one_or_none()
+
+    return None
+
+
+async def create_job(db, type: str, idempotency_key: Optional[str] = None,
+                     dedup_key: Optional[str] = None,
+                     admit: Optional[Callable[[], Awaitable[None]]] = None, **fields) -> Tuple[Task, bool]:
+    """
+    Crea un job, oppure restituisce quello esistente se la richiesta è una
+    ripetizione (stessa Idempotency-Key) o se lo stesso lavoro (`dedup_key`)
+    è già in corso. Gli indici unici sulla tabella rendono il controllo sicuro
+    anche con richieste concorrenti: chi perde la corsa all'inserimento rilegge
+    il job del vincitore. `admit` (controllo di ammissione) viene chiamato solo
+    se serve davvero un job nuovo. Restituisce (job, creato).
+    """
+    existing = await find_existing_job(db, type, idempotency_key, dedup_key)
+    if existing:
+        return existing, False
+
+    if admit is not None:
+        await admit()
+
+    task = Task(type=type, status=TaskStatus.pending, stage="queued", progress=0.0,
+                steps_done=0, version=0, stages={}, idempotency_key=idempotency_key,
+                dedup_key=dedup_key, **fields)
+    db.add(task)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        existing = await find_existing_job(db, type, idempotency_key, dedup_key)
+        if existing is None:
+            raise
+        return existing, False
+
+    await db.refresh(task)
+    return task, True
+
+
+async def reopen_job(db, job_id: int) -> bool:
+    """
+    Riporta in coda un job fallito o annullato, conservandone i checkpoint. Il
+    passaggio è condizionato allo stato, quindi due richieste concorrenti non
+    riaccodano lo stesso job due volte. Solleva IntegrityError se nel frattempo
+    è partito un job identico (indice sui job in corso).
+    """
+    result = await db.execute(
+        update(Task)
+        .where(Task.id == job_id, Task.status.in_((TaskStatus.failed, TaskStatus.cancelled)))
+        .values(status=TaskStatus.pending)
+    )
+    if result.rowcount == 0:
+        return False
+    await db.commit()
+    await update_job(job_id, stage="queued", error_message=None, finished_at=None, eta_seconds=None)
+    return True
+
+
+async def update_job(job_id: int, stage: Optional[str] = None, step_done: bool = False, **fields) -> dict:
+    """
+    Aggiorna un job dai worker: cambio di fase, passo completato (incremento
+    atomico, sicuro con più chunk in parallelo), stato finale o altri campi.
+    Ricalcola percentuale ed ETA e pubblica il nuovo stato ai client in attesa.
+    """
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        values = dict(fields)
+        values["version"] = Task.version + 1
+        if step_done:
+            values["steps_done"] = Task.steps_done + 1
+        # Un job annullato non riceve più aggiornamenti dai worker
+        result = await db.execute(
+            update(Task).where(Task.id == job_id, Task.status != TaskStatus.cancelled).values(**values)
+        )
+
+        task = await get_job(db, job_id)
+        if result.rowcount == 0:
+            return job_to_dict(task)
+        if stage and stage != task.stage:
+            stages = dict(task.stages or {})
+            if task.stage in stages:
+                stages[task.stage]["finished_at"] = now.isoformat()
+            stages[stage] = {"started_at": now.isoformat()}
+            task.stages = stages
+            task.stage = stage
+            if "steps_total" not in fields:
+                # I passi contati appartengono alla fase precedente
+                task.steps_done = 0
+                task.steps_total = None
+            if task.status == TaskStatus.pending and stage != "queued":
+                task.status = TaskStatus.processing
+                task.started_at = now
+
+        if task.status in TERMINAL_STATUSES:
+            task.finished_at = task.finished_at or now
+            if task.stage in (task.stages or {}):
+                stages = dict(task.stages)
+                stages[task.stage] = {**stages[task.stage], "finished_at": now.isoformat()}
+                task.stages = stages
+            if task.status == TaskStatus.completed:
+                task.progress = 100.0
+            task.eta_seconds = None
+        else:
+            task.progress = _progress(task)
+            task.eta_seconds = _eta(task, now)
+
+        await db.commit()
+        await db.refresh(task)
+        snapshot = job_to_dict(task)
+
+    await publish_job_update(snapshot)
+    return snapshot
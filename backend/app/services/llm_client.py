@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import logging
+import weakref
+from functools import lru_cache
+from typing import List, Optional
+import httpx
+import tiktoken
+import redis.asyncio as aioredis
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+from app.utils.metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Pool di connessioni keep-alive verso l'API, per processo
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "600"))
+
+# Limiti dell'account OpenAI, condivisi da tutti i processi (API e worker)
+OPENAI_CHAT_RPM = int(os.getenv("OPENAI_CHAT_RPM", "500"))
+OPENAI_CHAT_TPM = int(os.getenv("OPENAI_CHAT_TPM", "200000"))
+OPENAI_TRANSCRIPTION_RPM = int(os.getenv("OPENAI_TRANSCRIPTION_RPM", "50"))
+
+# Token bucket doppio (richieste e token) su Redis: si preleva da entrambi o da nessuno.
+# Restituisce 0 se il prelievo è riuscito, altrimenti i millisecondi da attendere.
+_TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[5])
+local function refill(key, capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + (now - ts) * capacity / 60000)
+end
+local function wait_for(tokens, capacity, cost)
+    if capacity <= 0 or tokens >= cost then return 0 end
+    return math.ceil((cost - tokens) * 60000 / capacity)
+end
+
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local request_cost, token_cost = tonumber(ARGV[3]), math.min(tonumber(ARGV[4]), tpm)
+local requests = refill(KEYS[1], rpm)
+local tokens = refill(KEYS[2], tpm)
+local wait = math.max(wait_for(requests, rpm, request_cost), wait_for(tokens, tpm, token_cost))
+if wait == 0 then
+    if rpm > 0 then requests = requests - request_cost end
+    if tpm > 0 then tokens = tokens - token_cost end
+end
+redis.call('HSET', KEYS[1], 'tokens', requests, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+redis.call('PEXPIRE', KEYS[2], 120000)
+return wait
+"""
+
+
+class RateLimiter:
+    """
+    Limitatore globale richieste/token al minuto, con lo stato su Redis: tutti
+    i processi consumano lo stesso budget dell'account. Chi supera il limite
+    attende il tempo necessario invece di ricevere un 429 dall'API.
+    Se Redis non risponde le chiamate non vengono limitate.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis = aioredis.from_url(redis_url)
+        self._take = self.redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, name: str, rpm: int, tpm: int, tokens: int = 0) -> None:
+        started = time.monotonic()
+        while True:
+            try:
+                wait_ms = await self._take(
+                    keys=[f"llm:rate:{name}:requests", f"llm:rate:{name}:tokens"],
+                    args=[rpm, tpm, 1, tokens, int(time.time() * 1000)]
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Limitatore {name} non disponibile, chiamata non limitata: {e}")
+                return
+
+            if wait_ms == 0:
+                metrics.observe(f"llm.rate_wait_seconds.{name}", time.monotonic() - started)
+                return
+            metrics.incr(f"llm.rate_limited.{name}")
+            await asyncio.sleep(wait_ms / 1000)
+
+
+rate_limiter = RateLimiter(REDIS_URL)
+
+# Un client per event loop: le connessioni httpx sono legate al loop che le ha aperte
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> AsyncOpenAI:
+    """Client OpenAI asincrono condiviso, con pool di connessioni keep-alive."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            # I ritentativi sono gestiti da services/resilience.py
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0)
+            )
+        )
+        _clients[loop] = client
+    return client
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    try:
+        return len(_encoding(model).encode(text))
+    except Exception:
+        # Codifica non disponibile (es. file BPE non scaricabile): stima approssimata
+        return len(text) // 4 + 1
+
+
+def count_message_tokens(messages: List[dict], model: str) -> int:
+    """Token del prompt di una chat, con l'overhead fisso di ogni messaggio."""
+    return sum(count_tokens(message["content"], model) + 4 for message in messages) + 3
+
+
+async def chat_completion(model: str, messages: List[dict], max_tokens: int, **kwargs):
+    """Chat completion con prenotazione dei token (prompt + max_tokens) sul limitatore globale."""
+    await rate_limiter.acquire(
+        f"chat:{model}", OPENAI_CHAT_RPM, OPENAI_CHAT_TPM,
+        count_message_tokens(messages, model) + max_tokens
+    )
+    started = time.monotonic()
+    response = await get_client().chat.completions.create(
+        model=model, messages=messages, max_tokens=max_tokens, **kwargs
+    )
+    metrics.observe("llm.latency_seconds.chat", time.monotonic() - started)
+    if response.usage:
+        metrics.incr("llm.tokens.prompt", response.usage.prompt_tokens)
+        metrics.incr("llm.tokens.completion", response.usage.completion_tokens)
+    return response
+
+
+class ChatStream:
+    """
+    Risposta di una chat completion in streaming: l'iterazione restituisce i
+    frammenti di testo man mano che arrivano; alla fine `stats` riporta token
+    (dall'usage dell'API o, in mancanza, contati con tiktoken), tempo al primo
+    token e latenza totale.
+    """
+
+    def __init__(self, stream, model: str, prompt_tokens: int, started: float):
+        self._stream = stream
+        self.model = model
+        self.started = started
+        self.stats = {"prompt_tokens": prompt_tokens, "completion_tokens": 0,
+                      "ttft_seconds": None, "latency_seconds": None}
+
+    async def __aiter__(self):
+        parts = []
+        usage = None
+        async for chunk in self._stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if self.stats["ttft_seconds"] is None:
+                    self.stats["ttft_seconds"] = time.monotonic() - self.started
+                    metrics.observe("llm.ttft_seconds.chat", self.stats["ttft_seconds"])
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+
+        self.stats["latency_seconds"] = time.monotonic() - self.started
+        if usage:
+            self.stats["prompt_tokens"] = usage.prompt_tokens
+            self.stats["completion_tokens"] = usage.completion_tokens
+        else:
+            self.stats["completion_tokens"] = count_tokens("".join(parts), self.model)
+        metrics.observe("llm.latency_seconds.chat", self.stats["latency_seconds"])
+        metrics.incr("llm.tokens.prompt", self.stats["prompt_tokens"])
+        metrics.incr("llm.tokens.completion", self.stats["completion_tokens"])
+
+
+async def stream_chat_completion(model: str, messages: List[dict], max_tokens: int, **kwargs) -> ChatStream:
+    """Come chat_completion, ma in streaming: restituisce un ChatStream da iterare."""
+    prompt_tokens = count_message_tokens(messages, model)
+    await rate_limiter.acquire(f"chat:{model}", OPENAI_CHAT_RPM, OPENAI_CHAT_TPM, prompt_tokens + max_tokens)
+    started = time.monotonic()
+    stream = await get_client().chat.completions.create(
+        model=model, messages=messages, max_tokens=max_tokens,
+        stream=True, stream_options={"include_usage": True}, **kwargs
+    )
+    return ChatStream(stream, model, prompt_tokens, started)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as audio_file:
+        return audio_file.read()
+
+
+async def transcribe(path: str, model: str, language: Optional[str] = None, **kwargs):
+    """Trascrizione di un file audio; il file viene letto fuori dall'event loop."""
+    content = await asyncio.to_thread(_read_file, path)
+    await rate_limiter.acquire(f"transcription:{model}", OPENAI_TRANSCRIPTION_RPM, 0)
+    if language:
+        kwargs["language"] = language
+
+    started = time.monotonic()
+    response = await get_client().audio.transcriptions.create(
+        model=model, file=(os.path.basename(path), content), **kwargs
+    )
+    metrics.observe("llm.latency_seconds.transcription", time.monotonic() - started)
+    return response
@@ -7,7 +7,7 @@ import logging
 from io import BytesIO
 from dotenv import load_dotenv
 from fastapi import HTTPException, Request
-from typing import Tuple, Dict, Optional, Union, Any
+from typing import Tuple, Dict, Optional, Union, Any, BinaryIO
 
 load_dotenv()
 
@@ -236,16 +236,17 @@ class OneDriveService:
         logger.debug(f"🔐 {account_type.title()} auth status for user {user_id}: {is_authenticated}")
         return is_authenticated
     
-    def upload_file(self, user_id: str, file_name: str, file_content: bytes, 
-                   folder_path: Optional[str] = None) -> Dict[str, Any]:
+    def upload_file(self, user_id: str, file_name: str, file_content: Union[bytes, BinaryIO], 
+                   folder_path: Optional[str] = None, file_size: Optional[int] = None) -> Dict[str, Any]:
         """
         Carica un file su OneDrive dell'utente.
         
         Args:
             user_id: ID dell'utente Microsoft
             file_name: Nome del file da caricare
-            file_content: Contenuto binario del file
+            file_content: Contenuto binario del file, oppure uno stream da leggere a blocchi
             folder_path: Percorso della cartella su OneDrive (opzionale)
+            file_size: Dimensione del file, necessaria se file_content è uno stream
             
         Returns:
             Dict[str, Any]: Dati del file caricato
@@ -254,7 +255,9 @@ class OneDriveService:
             HTTPException: Se l'autenticazione non è valida o l'upload fallisce
         """
         account_type = "personal" if self.is_personal_account else "business"
-        logger.debug(f"📤 Uploading file {file_name} for {account_type} user {user_id} (size: {len(file_content)} bytes)")
+        if file_size is None:
+            file_size = len(file_content)
+        logger.debug(f"📤 Uploading file {file_name} for {account_type} user {user_id} (size: {file_size} bytes)")
         
         token = self.get_valid_token(user_id)
         if not token:
@@ -285,7 +288,8 @@ class OneDriveService:
             # Esegui l'upload del file
             headers = {
                 "Authorization": f"Bearer {token}",
-                "Content-Type": "application/octet-stream"
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(file_size)
             }
             
             url = f"https://graph.microsoft.com/v1.0{upload_path}"
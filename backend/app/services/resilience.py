@@ -0,0 +1,220 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import httpx
+import openai
+from dotenv import load_dotenv
+from app.utils.http_range import parse_http_date
+from app.utils.metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Tentativi e backoff esponenziale con jitter
+RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "60"))
+
+# Circuit breaker: errori consecutivi per aprirlo e durata dell'apertura
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Stati del breaker esposti come gauge
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Codici HTTP per cui un nuovo tentativo ha senso
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Il provider è degradato: la chiamata fallisce subito, da ritentare dopo `retry_after` secondi."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito {name} aperto, nuovo tentativo tra {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Errori transitori (rete, timeout, 429, 5xx); gli errori della richiesta non si ritentano."""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Attesa indicata dal provider negli header retry-after-ms / Retry-After, se presente."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = parse_http_date(value)
+        if parsed is None:
+            return None
+        return max((parsed - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Backoff esponenziale con full jitter: uniforme tra 0 e base * 2^attempt, con un tetto."""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker per processo. Dopo `failure_threshold` errori transitori
+    consecutivi si apre: le chiamate falliscono subito con CircuitOpenError
+    (i task le rimettono in coda) per `reset_seconds`. Poi una sola chiamata
+    di prova decide se richiuderlo o riaprirlo.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.gauge(f"resilience.breaker.{self.name}.state", _STATE_VALUES[self.state])
+
+    def before_call(self) -> None:
+        if self.state == "open":
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                metrics.incr(f"resilience.breaker.{self.name}.rejected")
+                raise CircuitOpenError(self.name, remaining)
+            self.state = "half_open"
+            self._publish()
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                metrics.incr(f"resilience.breaker.{self.name}.rejected")
+                raise CircuitOpenError(self.name, self.reset_seconds)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self._probe_in_flight = False
+        self.failures = 0
+        if self.state != "closed":
+            logger.info(f"✅ Circuito {self.name} richiuso")
+            self.state = "closed"
+            self._publish()
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"⚠️ Circuito {self.name} aperto dopo {self.failures} errori")
+                metrics.incr(f"resilience.breaker.{self.name}.opened")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._publish()
+
+    def release(self) -> None:
+        """Chiamata terminata senza esito utile per il breaker (es. errore della richiesta)."""
+        self._probe_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+    return _breakers[name]
+
+
+async def hedged(name: str, call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """
+    Richiesta "hedged": se la prima chiamata non risponde entro `delay`
+    secondi ne parte una seconda identica, e vince la prima che riesce;
+    l'altra viene annullata. Taglia la coda lunga delle latenze.
+    """
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.incr(f"resilience.hedges.{name}")
+            tasks.add(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        metrics.incr(f"resilience.hedge_wins.{name}")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call_with_resilience(name: str, call: Callable[[], Awaitable[T]],
+                               hedge_delay: Optional[float] = None,
+                               max_attempts: int = RETRY_MAX_ATTEMPTS) -> T:
+    """
+    Esegue una chiamata esterna con circuit breaker, ritentativi sugli errori
+    transitori (Retry-After del provider se presente, altrimenti backoff con
+    jitter) e, se `hedge_delay` è indicato, richieste hedged.
+    """
+    breaker = get_breaker(name)
+    for attempt in range(max_attempts):
+        breaker.before_call()
+        try:
+            if hedge_delay:
+                result = await hedged(name, call, hedge_delay)
+            else:
+                result = await call()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.release()
+                raise
+            breaker.record_failure()
+            if breaker.state == "open":
+                # Questo errore ha aperto il circuito: il chiamante rimette in coda come per le chiamate rifiutate
+                raise CircuitOpenError(name, breaker.reset_seconds) from e
+            if attempt == max_attempts - 1:
+                raise
+
+            delay = retry_after_seconds(e)
+            delay = min(delay, RETRY_MAX_SECONDS) if delay is not None else backoff_seconds(attempt)
+            metrics.incr(f"resilience.retries.{name}")
+            logger.warning(f"🔁 {name}: tentativo {attempt + 1} fallito ({e}), nuovo tentativo tra {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
@@ -1,9 +1,38 @@
 import os
-from openai import OpenAI
+import re
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from app.services import llm_client
+from app.services.resilience import call_with_resilience
 
 load_dotenv()  # Carica le variabili dal file .env, se presente
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-3.5-turbo-0125")
+SUMMARY_MAX_TOKENS = 1500
+SUMMARY_TEMPERATURE = 0.3
+
+# Map-reduce: oltre questa soglia la trascrizione viene divisa in finestre riassunte in parallelo
+SUMMARY_WINDOW_TOKENS = int(os.getenv("SUMMARY_WINDOW_TOKENS", "6000"))
+SUMMARY_MAP_MAX_TOKENS = int(os.getenv("SUMMARY_MAP_MAX_TOKENS", "700"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "8"))
+
+# Modelli utilizzabili, dal più economico, con la finestra di contesto: "modello:token,modello:token"
+SUMMARY_MODEL_TIERS = [
+    (name, int(context))
+    for name, context in (
+        tier.rsplit(":", 1) for tier in os.getenv("SUMMARY_MODEL_TIERS", f"{SUMMARY_MODEL}:16385").split(",")
+    )
+]
+# Budget minimo per la risposta: sotto questa soglia si passa al modello successivo
+SUMMARY_MIN_OUTPUT_TOKENS = 500
+
+SYSTEM_PROMPT = "Sei un assistente legale specializzato in Modello 231."
 
 PROMPT_TEMPLATE = """
 Sei un assistente legale specializzato nell’elaborazione dei verbali degli Organismi di Vigilanza (OdV) in conformità al Modello 231.
@@ -62,18 +91,313 @@ Analizza la seguente trascrizione e genera un sommario strutturato, utile per la
 Trascrizione:
 """
 
-def generate_summary(transcription: str) -> str:    
+MAP_PROMPT_TEMPLATE = """
+Questa è una parte della trascrizione di una riunione dell'Organismo di Vigilanza (Modello 231).
+Le parti verranno unite in un unico verbale: non scrivere introduzioni né conclusioni.
+
+Estrai in forma di elenco, attribuendo gli interventi ai relatori quando possibile:
+- argomenti trattati (punti dell'ordine del giorno) e punti salienti della discussione;
+- criticità, osservazioni, indicazioni e raccomandazioni, con chi le ha fornite;
+- azioni decise (cosa, chi, quando);
+- documenti esaminati o presentati.
+
+Parte della trascrizione:
+"""
+
+REDUCE_PREFIX = """
+La trascrizione è stata suddivisa in parti consecutive; di seguito trovi, in ordine, gli appunti estratti da ciascuna parte.
+Usali come se fossero la trascrizione: unisci gli argomenti ripresi in più parti in un'unica sezione.
+"""
+
+# Versione dei prompt: cambia da sola quando si modifica uno dei testi, invalidando i riassunti in cache
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + PROMPT_TEMPLATE + MAP_PROMPT_TEMPLATE + REDUCE_PREFIX).encode()
+).hexdigest()[:12]
+
+
+def summary_cache_key(transcription: str) -> str:
+    """
+    Chiave di un riassunto: testo della trascrizione, versione dei prompt,
+    modelli e parametri di generazione. Stessa chiave = stesso riassunto.
+    """
+    params = {
+        "tiers": SUMMARY_MODEL_TIERS,
+        "max_tokens": SUMMARY_MAX_TOKENS,
+        "window_tokens": SUMMARY_WINDOW_TOKENS,
+        "map_max_tokens": SUMMARY_MAP_MAX_TOKENS,
+        "temperature": SUMMARY_TEMPERATURE,
+    }
+    signature = json.dumps([PROMPT_VERSION, params], sort_keys=True)
+    return hashlib.sha256(f"{signature}|{transcription}".encode()).hexdigest()
+
+
+# Confini naturali del testo: paragrafi HTML dell'editor, a capo (cambi di relatore), fine frase
+_PARAGRAPH_BREAK = re.compile(r"(?<=</p>)|\n+")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def _pieces(text: str, max_tokens: int) -> List[str]:
+    """Paragrafi (interventi) del testo; quelli troppo lunghi vengono spezzati sulle frasi o, al limite, sulle parole."""
+    pieces = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        if not paragraph.strip():
+            continue
+        if llm_client.count_tokens(paragraph, SUMMARY_MODEL) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_BREAK.split(paragraph):
+            if llm_client.count_tokens(sentence, SUMMARY_MODEL) <= max_tokens:
+                pieces.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // llm_client.count_tokens(sentence, SUMMARY_MODEL))
+            pieces.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+    return pieces
+
+
+def _is_anchor(piece: str, tokens: int, max_tokens: int) -> bool:
+    """
+    Confine di finestra definito dal contenuto: un intervento chiude la
+    finestra con probabilità proporzionale alla sua lunghezza, decisa
+    dall'hash del suo testo (in media una finestra ogni ~3/4 di max_tokens).
+    """
+    draw = int(hashlib.sha256(piece.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return draw < tokens / (max_tokens / 4)
+
+
+def split_windows(text: str, max_tokens: int = SUMMARY_WINDOW_TOKENS) -> List[str]:
+    """
+    Divide il testo in finestre consecutive di al massimo `max_tokens` token
+    (contati con tiktoken), tagliando tra un intervento e l'altro o, se un
+    intervento è troppo lungo, tra una frase e l'altra.
+    Oltre metà finestra il taglio cade sugli interventi scelti dal loro
+    contenuto (_is_anchor), non sul conteggio progressivo dei token: una
+    modifica locale cambia solo la finestra che la contiene e le altre
+    restano identiche, con i riassunti parziali riutilizzabili.
+    """
+    windows = []
+    current = []
+    current_tokens = 0
+    for piece in _pieces(text, max_tokens):
+        tokens = llm_client.count_tokens(piece, SUMMARY_MODEL) + 1
+        if current and current_tokens + tokens > max_tokens:
+            windows.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+        if current_tokens >= max_tokens // 2 and _is_anchor(piece, tokens, max_tokens):
+            windows.append("\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        windows.append("\n".join(current))
+    return windows
+
+
+def window_cache_key(window: str, model: str, max_tokens: int) -> str:
+    """Chiave del riassunto parziale di una finestra: testo, versione dei prompt, modello e parametri."""
+    signature = json.dumps([PROMPT_VERSION, model, max_tokens, SUMMARY_TEMPERATURE])
+    return hashlib.sha256(f"{signature}|{window}".encode()).hexdigest()
+
+
+def _messages(prompt: str) -> List[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def choose_tier(input_tokens: int, max_tokens: int) -> Tuple[str, int]:
+    """
+    Il modello più economico nel cui contesto stanno il prompt e una risposta
+    di almeno SUMMARY_MIN_OUTPUT_TOKENS token; `max_tokens` viene ridotto al
+    budget che resta nel contesto.
+    """
+    for model, context in SUMMARY_MODEL_TIERS:
+        budget = context - input_tokens
+        if budget >= min(max_tokens, SUMMARY_MIN_OUTPUT_TOKENS):
+            return model, min(max_tokens, budget)
+    raise ValueError(f"Prompt di {input_tokens} token oltre il contesto di tutti i modelli configurati")
+
+
+def plan_summary(transcription: str, cached_partials: Optional[Dict[str, str]] = None) -> Tuple[dict, List[str]]:
+    """
+    Piano del riassunto calcolato prima di qualsiasi chiamata: token del
+    prompt e della trascrizione, modalità (chiamata singola o map-reduce),
+    modello e max_tokens di ogni fase, finestre già riassunte in
+    `cached_partials` (chiave della finestra -> riassunto parziale), stima
+    dei token complessivi. Restituisce il piano (serializzabile) e le finestre.
+    """
+    prompt_tokens = llm_client.count_message_tokens(_messages(PROMPT_TEMPLATE), SUMMARY_MODEL)
+    transcript_tokens = llm_client.count_tokens(transcription, SUMMARY_MODEL)
+
+    if transcript_tokens <= SUMMARY_WINDOW_TOKENS:
+        model, max_tokens = choose_tier(prompt_tokens + transcript_tokens, SUMMARY_MAX_TOKENS)
+        plan = {
+            "mode": "single",
+            "prompt_tokens": prompt_tokens,
+            "transcript_tokens": transcript_tokens,
+            "windows": 1,
+            "model": model,
+            "max_tokens": max_tokens,
+            "estimated_tokens": prompt_tokens + transcript_tokens + max_tokens,
+            "steps": 1,
+        }
+        return plan, [transcription]
+
+    windows = split_windows(transcription)
+    map_prompt_tokens = llm_client.count_message_tokens(_messages(MAP_PROMPT_TEMPLATE), SUMMARY_MODEL)
+    map_model, map_max_tokens = choose_tier(map_prompt_tokens + SUMMARY_WINDOW_TOKENS, SUMMARY_MAP_MAX_TOKENS)
+    window_keys = [window_cache_key(window, map_model, map_max_tokens) for window in windows]
+    # Finestre invariate rispetto a un'esecuzione precedente: il riassunto parziale è già pronto
+    missing = [index for index, key in enumerate(window_keys) if key not in (cached_partials or {})]
+    missing_tokens = sum(llm_client.count_tokens(windows[index], SUMMARY_MODEL) for index in missing)
+    # Il modello della fase finale si sceglie sugli appunti effettivi; qui la stima con appunti di lunghezza massima
+    notes_tokens = min(len(windows) * map_max_tokens, SUMMARY_WINDOW_TOKENS)
+    model, max_tokens = choose_tier(prompt_tokens + notes_tokens, SUMMARY_MAX_TOKENS)
+    plan = {
+        "mode": "map_reduce",
+        "prompt_tokens": prompt_tokens,
+        "transcript_tokens": transcript_tokens,
+        "windows": len(windows),
+        "windows_reused": len(windows) - len(missing),
+        "window_keys": window_keys,
+        "map_model": map_model,
+        "map_max_tokens": map_max_tokens,
+        "model": model,
+        "max_tokens": max_tokens,
+        "estimated_tokens": (
+            missing_tokens + len(missing) * (map_prompt_tokens + map_max_tokens)
+            + prompt_tokens + notes_tokens + max_tokens
+        ),
+        "steps": len(missing) + 1,
+    }
+    return plan, windows
+
+
+OnCall = Optional[Callable[[dict], Awaitable[None]]]
+# on_delta(offset, testo): frammento generato a partire dal carattere `offset` (0 a ogni nuovo tentativo)
+OnDelta = Optional[Callable[[int, str], Awaitable[None]]]
+
+
+async def _complete(prompt: str, model: str, max_tokens: int, phase: str,
+                    window_index: Optional[int] = None, on_call: OnCall = None, on_delta: OnDelta = None) -> str:
+    """
+    Una chiamata in streaming (per misurare il tempo al primo token); `on_call`
+    riceve token e tempi, `on_delta` il testo man mano che arriva.
+    """
+    async def attempt():
+        stream = await llm_client.stream_chat_completion(
+            model=model, messages=_messages(prompt), temperature=SUMMARY_TEMPERATURE, max_tokens=max_tokens
+        )
+        parts = []
+        offset = 0
+        async for delta in stream:
+            parts.append(delta)
+            if on_delta:
+                await on_delta(offset, delta)
+            offset += len(delta)
+        return "".join(parts).strip(), stream.stats
+
+    text, stats = await call_with_resilience("openai.chat", attempt)
+    if on_call:
+        await on_call({"phase": phase, "window_index": window_index, "model": model,
+                       "max_tokens": max_tokens, **stats})
+    return text
+
+
+OnPartial = Optional[Callable[[str, str], Awaitable[None]]]
+
+
+async def _map_windows(windows: List[str], model: str, max_tokens: int, phase: str,
+                       on_step: Optional[Callable[[], Awaitable[None]]], on_call: OnCall,
+                       keys: Optional[List[str]] = None, cached_partials: Optional[Dict[str, str]] = None,
+                       on_partial: OnPartial = None) -> List[str]:
+    """
+    Riassunti parziali delle finestre, al massimo SUMMARY_MAP_CONCURRENCY alla
+    volta, nell'ordine originale. Con `keys` le finestre già presenti in
+    `cached_partials` non vengono richiamate e quelle nuove passano a `on_partial`.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+    cached_partials = cached_partials or {}
+
+    async def summarize_window(index: int, window: str) -> str:
+        key = keys[index] if keys else None
+        if key in cached_partials:
+            return cached_partials[key]
+        async with semaphore:
+            partial = await _complete(MAP_PROMPT_TEMPLATE + window, model, max_tokens, phase, index, on_call)
+        if key and on_partial:
+            await on_partial(key, partial)
+        if on_step:
+            await on_step()
+        return partial
+
+    tasks = [asyncio.ensure_future(summarize_window(index, window)) for index, window in enumerate(windows)]
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=[
-                {"role": "system", "content": "Sei un assistente legale specializzato in Modello 231."},
-                {"role": "user", "content": PROMPT_TEMPLATE + transcription}
-            ],
-            temperature=0.3,
-            max_tokens=1500
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # Un errore (o l'annullamento del job) ferma anche le finestre ancora in corso
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def _join_notes(partials: List[str]) -> str:
+    return "\n\n".join(f"[Parte {index + 1}]\n{partial}" for index, partial in enumerate(partials))
+
+
+async def generate_summary(transcription: str,
+                           on_plan: Optional[Callable[[dict], Awaitable[None]]] = None,
+                           on_step: Optional[Callable[[], Awaitable[None]]] = None,
+                           on_call: OnCall = None,
+                           on_delta: OnDelta = None,
+                           cached_partials: Optional[Dict[str, str]] = None,
+                           on_partial: OnPartial = None) -> str:
+    """
+    Genera il riassunto secondo il piano di plan_summary; gli errori (dopo i
+    ritentativi) vengono sollevati, mai salvati come testo.
+    Una trascrizione che sta in una finestra viene riassunta con una sola
+    chiamata; una più lunga con map-reduce: le finestre vengono riassunte in
+    parallelo, poi un'ultima chiamata compone dagli appunti le sezioni del
+    verbale. Se gli appunti superano a loro volta una finestra vengono
+    condensati con un altro passaggio di map.
+    Rielaborazione incrementale: le finestre il cui riassunto parziale è in
+    `cached_partials` (di un'esecuzione precedente) non vengono ririassunte;
+    quelle nuove arrivano a `on_partial(chiave, testo)` per essere salvate.
+    `on_plan(piano)` e `on_step()` riportano l'avanzamento (finestre più
+    passaggio finale), `on_call(consumi)` token e tempi di ogni chiamata,
+    `on_delta` il testo del riassunto finale man mano che viene generato.
+    """
+    plan, windows = plan_summary(transcription, cached_partials)
+    logger.info(
+        f"🧭 Piano del riassunto: {plan['mode']}, {plan['transcript_tokens']} token in "
+        f"{plan['windows']} finestre ({plan.get('windows_reused', 0)} già riassunte), "
+        f"stima {plan['estimated_tokens']} token"
+    )
+    if on_plan:
+        await on_plan(plan)
+
+    if plan["mode"] == "single":
+        summary = await _complete(PROMPT_TEMPLATE + transcription, plan["model"], plan["max_tokens"],
+                                  "single", on_call=on_call, on_delta=on_delta)
+    else:
+        partials = await _map_windows(
+            windows, plan["map_model"], plan["map_max_tokens"], "map", on_step, on_call,
+            keys=plan["window_keys"], cached_partials=cached_partials, on_partial=on_partial
         )
-        print(f"response ------> {response.choices[0].message.content.strip()}")
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"❌ Errore nella generazione del riassunto: {str(e)}"
+        notes = _join_notes(partials)
+        while len(partials) > 1 and llm_client.count_tokens(notes, SUMMARY_MODEL) > SUMMARY_WINDOW_TOKENS:
+            partials = await _map_windows(split_windows(notes), plan["map_model"], plan["map_max_tokens"],
+                                          "condense", None, on_call)
+            notes = _join_notes(partials)
+
+        prompt = PROMPT_TEMPLATE.replace("Trascrizione:", REDUCE_PREFIX.strip() + "\n\nAppunti:") + notes
+        model, max_tokens = choose_tier(
+            llm_client.count_message_tokens(_messages(prompt), SUMMARY_MODEL), SUMMARY_MAX_TOKENS
+        )
+        summary = await _complete(prompt, model, max_tokens, "reduce", on_call=on_call, on_delta=on_delta)
+
+    if on_step:
+        await on_step()
+    logger.debug(f"📝 Riassunto generato: {len(summary)} caratteri")
+    return summary
@@ -0,0 +1,134 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from app.utils.metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRANSCODE_CACHE_DIR = os.getenv("TRANSCODE_CACHE_DIR", os.path.join(os.getcwd(), "storage", "transcode_cache"))
+TRANSCODE_CACHE_MAX_BYTES = int(os.getenv("TRANSCODE_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+
+class TranscodeCache:
+    """
+    Cache su disco degli audio già transcodificati, indicizzata per
+    (hash del contenuto sorgente, profilo di destinazione). Un nuovo tentativo
+    o una nuova trascrizione con un modello diverso riusano il file convertito.
+    L'ordine LRU è dato dalla data di modifica, aggiornata a ogni accesso.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(blob_key: str, profile: dict) -> str:
+        signature = json.dumps(profile, sort_keys=True)
+        return hashlib.sha256(f"{blob_key}|{signature}".encode()).hexdigest()
+
+    def _paths(self, key: str, extension: str):
+        return os.path.join(self.root, f"{key}{extension}"), os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: str, extension: str) -> Optional[dict]:
+        """Restituisce {"path", "meta"} se l'artefatto è in cache, altrimenti None."""
+        artifact_path, meta_path = self._paths(key, extension)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            os.utime(artifact_path)
+            os.utime(meta_path)
+        except (OSError, json.JSONDecodeError):
+            metrics.incr("transcode_cache.misses")
+            return None
+
+        metrics.incr("transcode_cache.hits")
+        logger.info(f"💾 Cache transcodifica: hit {key[:12]}")
+        return {"path": artifact_path, "meta": meta}
+
+    def reserve(self, extension: str) -> str:
+        """Percorso temporaneo nella cartella della cache, su cui scrivere l'artefatto."""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp_", suffix=extension)
+        os.close(fd)
+        return tmp_path
+
+    def put(self, key: str, extension: str, tmp_path: str, meta: dict) -> str:
+        """Pubblica l'artefatto scritto su `tmp_path` (rename atomico) e applica il limite di spazio."""
+        artifact_path, meta_path = self._paths(key, extension)
+        os.replace(tmp_path, artifact_path)
+
+        fd, tmp_meta = tempfile.mkstemp(dir=self.root, prefix=".tmp_", suffix=".json")
+        with os.fdopen(fd, "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_meta, meta_path)
+
+        metrics.incr("transcode_cache.stores")
+        self.evict(keep=key)
+        return artifact_path
+
+    def checkout(self, artifact_path: str, output_path: str) -> str:
+        """
+        Rende l'artefatto disponibile al job in `output_path`: un hard link
+        (o una copia se la cartella è su un altro filesystem). Un'eviction
+        concorrente rimuove solo il nome nella cache, il file del job resta.
+        Solleva FileNotFoundError se l'artefatto è appena stato rimosso.
+        """
+        try:
+            os.link(artifact_path, output_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(artifact_path, output_path)
+        return output_path
+
+    def discard(self, tmp_path: str) -> None:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Rimuove gli artefatti usati meno di recente finché la cache non rientra
+        nel limite. L'artefatto `keep` (appena scritto) non viene mai rimosso.
+        """
+        with self._lock:
+            entries = {}
+            for name in os.listdir(self.root):
+                if name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(self.root, name)
+                key = name.split(".", 1)[0]
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                size, mtime, paths = entries.get(key, (0, 0.0, []))
+                entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime), paths + [path])
+
+            total = sum(size for size, _, _ in entries.values())
+            for key, (size, _, paths) in sorted(entries.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                metrics.incr("transcode_cache.evictions")
+
+            metrics.gauge("transcode_cache.bytes", total)
+
+
+# 🔹 Istanza globale della cache
+transcode_cache = TranscodeCache(TRANSCODE_CACHE_DIR, TRANSCODE_CACHE_MAX_BYTES)
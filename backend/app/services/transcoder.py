@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import resource
+import tempfile
+import threading
+import subprocess
+from typing import List, Optional
+from dotenv import load_dotenv
+from app.services.blob_store import blob_store, BLOB_CHUNK_SIZE
+from app.utils.metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+TRANSCODE_TIMEOUT = int(os.getenv("TRANSCODE_TIMEOUT", "3600"))
+
+# Formato richiesto dalla trascrizione: mono, 16 kHz
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_RATE = 16000
+
+# Parametri di codifica di default (MP3 64 kbps)
+DEFAULT_OUTPUT_ARGS = ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"]
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def _feed_stdin(source, stdin) -> None:
+    """Copia lo stream sorgente nello stdin di ffmpeg a blocchi di dimensione fissa."""
+    try:
+        while True:
+            chunk = source.read(BLOB_CHUNK_SIZE)
+            if not chunk:
+                break
+            stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg ha terminato prima di leggere tutto: l'errore viene riportato dal processo
+        pass
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def run_ffmpeg(input_args: List[str], output_args: List[str], output_path: str,
+               source=None, timeout: int = TRANSCODE_TIMEOUT) -> dict:
+    """
+    Esegue ffmpeg scrivendo l'output direttamente su disco. Se viene passato
+    uno stream sorgente, questo viene inviato a ffmpeg tramite stdin a blocchi.
+    Restituisce le metriche del processo: tempo e picco di memoria (RSS) di ffmpeg.
+    """
+    cmd = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y", *input_args, *output_args, output_path]
+
+    started = time.monotonic()
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE if source is not None else subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr_file,
+        )
+
+        feeder = None
+        if source is not None:
+            feeder = threading.Thread(target=_feed_stdin, args=(source, process.stdin), daemon=True)
+            feeder.start()
+
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            # wait4 restituisce anche l'utilizzo di risorse del solo processo ffmpeg
+            _, status, rusage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        if feeder is not None:
+            feeder.join()
+
+        elapsed = time.monotonic() - started
+        if process.returncode != 0:
+            stderr_file.seek(0)
+            error = stderr_file.read().decode(errors="replace").strip()
+            raise TranscodeError(f"ffmpeg terminato con codice {process.returncode}: {error[-2000:]}")
+
+    return {
+        "elapsed_seconds": elapsed,
+        "ffmpeg_peak_rss_kb": rusage.ru_maxrss,
+        "ffmpeg_cpu_seconds": rusage.ru_utime + rusage.ru_stime,
+        "worker_peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def transcode_blob(blob_key: str, output_path: str, output_args: Optional[List[str]] = None) -> dict:
+    """
+    Converte un blob audio in mono 16 kHz con ffmpeg, in streaming: il file
+    sorgente viene letto direttamente dal blob store (o inviato via stdin se
+    lo storage non è locale) e l'output viene scritto su disco. La memoria
+    usata non dipende dalla durata della registrazione.
+    """
+    output_args = output_args or DEFAULT_OUTPUT_ARGS
+    conversion_args = ["-vn", "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), *output_args]
+
+    local_path = blob_store.local_path(blob_key)
+    try:
+        if local_path:
+            stats = run_ffmpeg(["-i", local_path], conversion_args, output_path)
+        else:
+            with blob_store.open(blob_key) as source:
+                stats = run_ffmpeg(["-i", "pipe:0"], conversion_args, output_path, source=source)
+    except TranscodeError:
+        metrics.incr("transcode.errors")
+        raise
+
+    stats["input_bytes"] = os.path.getsize(local_path) if local_path else blob_store.size(blob_key)
+    stats["output_bytes"] = os.path.getsize(output_path)
+
+    metrics.incr("transcode.runs")
+    metrics.observe("transcode.elapsed_seconds", stats["elapsed_seconds"])
+    metrics.observe("transcode.ffmpeg_peak_rss_kb", stats["ffmpeg_peak_rss_kb"])
+    metrics.gauge("transcode.worker_peak_rss_kb", stats["worker_peak_rss_kb"])
+
+    logger.info(
+        f"🎛️ Transcodifica {blob_key[:12]}: {stats['elapsed_seconds']:.1f}s, "
+        f"picco RSS ffmpeg {stats['ffmpeg_peak_rss_kb'] / 1024:.1f} MB, "
+        f"{stats['input_bytes']} -> {stats['output_bytes']} byte"
+    )
+    return stats
@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+from app.database import AsyncSessionLocal
+from app.models.transcription_cache import TranscriptionCacheEntry
+from app.services.transcription_engines import TranscriptionEngine, TRANSCRIPTION_LANGUAGE, TRANSCRIPTION_PROMPT
+from app.utils.metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_CACHE_ENABLED = os.getenv("TRANSCRIPTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Limite della cache (dimensione dei risultati JSON), oltre il quale si eliminano le voci usate meno di recente
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+
+class TranscriptionCache:
+    """
+    Cache persistente (tabella transcription_cache) dei risultati di
+    trascrizione, indicizzata per contenuto dell'audio (SHA-256 del blob),
+    preparazione, intervallo, modello, lingua e prompt. Un audio ricaricato
+    o ritrascritto con gli stessi parametri non chiama di nuovo il motore.
+    Ogni hit accumula tempo e costo risparmiati; oltre `max_bytes` vengono
+    eliminate le voci usate meno di recente.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(audio_sha256: str, variant: str, start: Optional[float], end: Optional[float],
+                 engine: TranscriptionEngine) -> str:
+        interval = "full" if start is None else f"{start:.3f}-{end:.3f}"
+        signature = json.dumps(
+            [audio_sha256, variant, interval, engine.model_id, TRANSCRIPTION_LANGUAGE, TRANSCRIPTION_PROMPT]
+        )
+        return hashlib.sha256(signature.encode()).hexdigest()
+
+    @classmethod
+    def make_file_key(cls, audio_sha256: str, use_vad: bool, engine: TranscriptionEngine) -> str:
+        """Chiave della trascrizione completa di un file, controllata prima di accodare il job."""
+        return cls.make_key(audio_sha256, f"file:vad={int(use_vad)}", None, None, engine)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Risultato in cache per `key`, o None; un hit aggiorna subito uso e risparmi."""
+        if not TRANSCRIPTION_CACHE_ENABLED:
+            return None
+        result = await self.record_hit(key)
+        if result is None:
+            metrics.incr("transcription_cache.misses")
+        return result
+
+    async def lookup(self, key: str) -> Optional[dict]:
+        """
+        Risultato in cache per `key`, o None, senza contarlo come hit: per chi
+        potrebbe non usarlo (es. richiesta agganciata a un job esistente) e
+        chiama `record_hit` solo quando lo usa davvero.
+        """
+        if not TRANSCRIPTION_CACHE_ENABLED:
+            return None
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(TranscriptionCacheEntry.result).filter(TranscriptionCacheEntry.cache_key == key)
+            )
+            cached = result.scalar_one_or_none()
+        if cached is None:
+            metrics.incr("transcription_cache.misses")
+        return cached
+
+    async def record_hit(self, key: str) -> Optional[dict]:
+        """Conta un hit di `key` (uso, tempo e costo risparmiati) e restituisce il risultato, o None se assente."""
+        Entry = TranscriptionCacheEntry
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Entry)
+                .where(Entry.cache_key == key)
+                .values(
+                    hits=Entry.hits + 1,
+                    saved_seconds=Entry.saved_seconds + Entry.elapsed_seconds,
+                    saved_usd=Entry.saved_usd + Entry.cost_usd,
+                    last_used_at=datetime.utcnow()
+                )
+                .returning(Entry.result, Entry.elapsed_seconds, Entry.cost_usd)
+            )
+            row = result.one_or_none()
+            await db.commit()
+
+        if row is None:
+            return None
+
+        metrics.incr("transcription_cache.hits")
+        metrics.incr("transcription_cache.saved_seconds", row.elapsed_seconds)
+        metrics.incr("transcription_cache.saved_usd", row.cost_usd)
+        logger.info(f"💾 Cache trascrizioni: hit {key[:12]}, risparmiati {row.elapsed_seconds:.1f}s")
+        return row.result
+
+    async def put(self, key: str, audio_sha256: str, variant: str, start: Optional[float], end: Optional[float],
+                  engine: TranscriptionEngine, result: dict, audio_seconds: float, elapsed_seconds: float) -> None:
+        """Salva un risultato appena calcolato e applica il limite di spazio."""
+        if not TRANSCRIPTION_CACHE_ENABLED:
+            return
+        size_bytes = len(json.dumps(result))
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                pg_insert(TranscriptionCacheEntry).values(
+                    cache_key=key,
+                    audio_sha256=audio_sha256,
+                    variant=variant,
+                    start_seconds=start,
+                    end_seconds=end,
+                    model_id=engine.model_id,
+                    language=TRANSCRIPTION_LANGUAGE,
+                    prompt=TRANSCRIPTION_PROMPT,
+                    result=result,
+                    size_bytes=size_bytes,
+                    audio_seconds=audio_seconds,
+                    elapsed_seconds=elapsed_seconds,
+                    cost_usd=audio_seconds / 60 * engine.cost_per_minute,
+                    hits=0,
+                    saved_seconds=0.0,
+                    saved_usd=0.0,
+                    created_at=now,
+                    last_used_at=now
+                ).on_conflict_do_nothing(index_elements=["cache_key"])
+            )
+            await db.commit()
+
+        metrics.incr("transcription_cache.stores")
+        await self.evict()
+
+    async def evict(self) -> None:
+        """Elimina le voci usate meno di recente finché la cache non rientra nel limite."""
+        Entry = TranscriptionCacheEntry
+        running = select(
+            Entry.id,
+            func.sum(Entry.size_bytes).over(order_by=(Entry.last_used_at.desc(), Entry.id.desc())).label("running")
+        ).subquery()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(Entry).where(Entry.id.in_(select(running.c.id).where(running.c.running > self.max_bytes)))
+            )
+            await db.commit()
+        if result.rowcount:
+            metrics.incr("transcription_cache.evictions", result.rowcount)
+
+    async def stats(self) -> dict:
+        """Occupazione della cache e risparmi accumulati dalle voci presenti."""
+        Entry = TranscriptionCacheEntry
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    func.count(Entry.id),
+                    func.coalesce(func.sum(Entry.size_bytes), 0),
+                    func.coalesce(func.sum(Entry.hits), 0),
+                    func.coalesce(func.sum(Entry.saved_seconds), 0.0),
+                    func.coalesce(func.sum(Entry.saved_usd), 0.0),
+                )
+            )
+            entries, size_bytes, hits, saved_seconds, saved_usd = result.one()
+
+        return {
+            "enabled": TRANSCRIPTION_CACHE_ENABLED,
+            "entries": entries,
+            "size_bytes": size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "saved_seconds": round(saved_seconds, 1),
+            "saved_usd": round(saved_usd, 4),
+        }
+
+
+# 🔹 Istanza globale della cache
+transcription_cache = TranscriptionCache(TRANSCRIPTION_CACHE_MAX_BYTES)
@@ -0,0 +1,179 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from app.services import llm_client
+from app.services.resilience import call_with_resilience
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Motore usato quando il job non ne indica uno: "openai" (API remota) o "local" (CPU)
+TRANSCRIPTION_ENGINE = os.getenv("TRANSCRIPTION_ENGINE", "openai")
+TRANSCRIPTION_LANGUAGE = "it"
+# Prompt iniziale facoltativo (nomi propri, sigle, stile): orienta il riconoscimento
+TRANSCRIPTION_PROMPT = os.getenv("TRANSCRIPTION_PROMPT") or None
+
+TRANSCRIPTION_MODEL = os.getenv("TRANSCRIPTION_MODEL", "whisper-1")
+# Richieste hedged sui chunk brevi: seconda richiesta dopo questo ritardo (0 = disattivate)
+TRANSCRIPTION_HEDGE_DELAY_SECONDS = float(os.getenv("TRANSCRIPTION_HEDGE_DELAY_SECONDS", "0"))
+TRANSCRIPTION_HEDGE_MAX_SECONDS = float(os.getenv("TRANSCRIPTION_HEDGE_MAX_SECONDS", "120"))
+# Prezzo dell'API per minuto di audio, per le statistiche della cache dei risultati
+TRANSCRIPTION_COST_PER_MINUTE = float(os.getenv("TRANSCRIPTION_COST_PER_MINUTE", "0.006"))
+
+# Motore locale: modello Whisper su CTranslate2 (faster-whisper), quantizzato int8 su CPU
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "4"))
+# Trascrizioni contemporanee per processo sulla stessa istanza del modello
+LOCAL_WHISPER_WORKERS = int(os.getenv("LOCAL_WHISPER_WORKERS", "2"))
+LOCAL_WHISPER_BEAM_SIZE = int(os.getenv("LOCAL_WHISPER_BEAM_SIZE", "5"))
+
+
+class TranscriptionEngine:
+    """
+    Interfaccia comune dei motori di trascrizione. `transcribe` restituisce
+    {"language", "segments", "transcription"}, con i segmenti nel formato
+    verbose_json di Whisper (id, start, end, text, ...).
+    """
+
+    name: str = ""
+    # Costo per minuto di audio trascritto (0 per i motori locali)
+    cost_per_minute: float = 0.0
+
+    @property
+    def model_id(self) -> str:
+        """Identifica motore e modello (deduplica dei job, cache dei risultati)."""
+        raise NotImplementedError
+
+    async def transcribe(self, path: str, duration: Optional[float] = None) -> dict:
+        raise NotImplementedError
+
+
+class OpenAIEngine(TranscriptionEngine):
+    name = "openai"
+    cost_per_minute = TRANSCRIPTION_COST_PER_MINUTE
+
+    @property
+    def model_id(self) -> str:
+        return f"openai:{TRANSCRIPTION_MODEL}"
+
+    async def transcribe(self, path: str, duration: Optional[float] = None) -> dict:
+        if not llm_client.OPENAI_API_KEY:
+            raise RuntimeError("❌ OPENAI_API_KEY mancante. Aggiungila nel file .env.")
+
+        hedge_delay = None
+        if TRANSCRIPTION_HEDGE_DELAY_SECONDS and duration is not None and duration <= TRANSCRIPTION_HEDGE_MAX_SECONDS:
+            hedge_delay = TRANSCRIPTION_HEDGE_DELAY_SECONDS
+
+        transcription = await call_with_resilience(
+            "openai.transcription",
+            lambda: llm_client.transcribe(
+                path,
+                model=TRANSCRIPTION_MODEL,
+                response_format="verbose_json",
+                language=TRANSCRIPTION_LANGUAGE,
+                **({"prompt": TRANSCRIPTION_PROMPT} if TRANSCRIPTION_PROMPT else {})
+            ),
+            hedge_delay=hedge_delay
+        )
+
+        return {
+            "language": TRANSCRIPTION_LANGUAGE,
+            "segments": [segment.dict() for segment in transcription.segments],
+            "transcription": transcription.text
+        }
+
+
+class LocalWhisperEngine(TranscriptionEngine):
+    """
+    Whisper in locale su CPU (faster-whisper, CTranslate2 con pesi int8), per
+    le installazioni senza accesso all'API. Il modello viene caricato una volta
+    per processo worker e condiviso da un pool di thread: CTranslate2 rilascia
+    il GIL ed esegue `num_workers` trascrizioni in parallelo sulla stessa
+    istanza. La parallelizzazione tra processi resta quella dei worker Celery
+    (che, essendo processi daemon, non possono avviare un proprio pool di processi).
+    """
+
+    name = "local"
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=LOCAL_WHISPER_WORKERS, thread_name_prefix="whisper")
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{LOCAL_WHISPER_MODEL}-{LOCAL_WHISPER_COMPUTE_TYPE}"
+
+    def _load_model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise RuntimeError(
+                        "Motore locale non disponibile: installare faster-whisper (pip install faster-whisper)"
+                    ) from e
+                logger.info(f"🧠 Caricamento modello locale {LOCAL_WHISPER_MODEL} ({LOCAL_WHISPER_COMPUTE_TYPE})")
+                self._model = WhisperModel(
+                    LOCAL_WHISPER_MODEL,
+                    device="cpu",
+                    compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                    cpu_threads=LOCAL_WHISPER_CPU_THREADS,
+                    num_workers=LOCAL_WHISPER_WORKERS
+                )
+            return self._model
+
+    def _transcribe_sync(self, path: str) -> dict:
+        model = self._load_model()
+        segments, info = model.transcribe(
+            path,
+            language=TRANSCRIPTION_LANGUAGE,
+            beam_size=LOCAL_WHISPER_BEAM_SIZE,
+            initial_prompt=TRANSCRIPTION_PROMPT
+        )
+
+        result = []
+        for index, segment in enumerate(segments):
+            result.append({
+                "id": index,
+                "seek": segment.seek,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "tokens": list(segment.tokens),
+                "temperature": segment.temperature,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+            })
+
+        return {
+            "language": info.language or TRANSCRIPTION_LANGUAGE,
+            "segments": result,
+            "transcription": "".join(segment["text"] for segment in result).strip()
+        }
+
+    async def transcribe(self, path: str, duration: Optional[float] = None) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transcribe_sync, path)
+
+
+ENGINES: Dict[str, TranscriptionEngine] = {}
+
+
+def get_engine(name: Optional[str] = None) -> TranscriptionEngine:
+    name = name or TRANSCRIPTION_ENGINE
+    if name not in ENGINES:
+        if name == "openai":
+            ENGINES[name] = OpenAIEngine()
+        elif name == "local":
+            ENGINES[name] = LocalWhisperEngine()
+        else:
+            raise ValueError(f"Motore di trascrizione non supportato: {name}")
+    return ENGINES[name]
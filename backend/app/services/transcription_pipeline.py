@@ -0,0 +1,161 @@
+import os
+import time
+import logging
+from typing import List
+from app.services.transcriber import transcribe_audio
+from app.services.transcription_engines import get_engine
+from app.services.transcription_cache import transcription_cache
+from app.services.resilience import CircuitOpenError, is_retryable
+from app.services.blob_store import blob_store
+from app.services.transcoder import transcode_blob, TARGET_CHANNELS, TARGET_SAMPLE_RATE
+from app.services.encoding_planner import plan_encoding, link_passthrough
+from app.services.transcode_cache import transcode_cache
+from app.services import vad
+from app.utils.media_probe import probe_media
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkTranscriptionError(Exception):
+    pass
+
+
+def prepare_audio(blob_key: str, size_bytes: int, stored_metadata: dict, work_dir: str, use_vad: bool) -> dict:
+    """
+    Prepara l'audio da trascrivere: piano di codifica, poi passthrough,
+    artefatto già in cache oppure transcodifica (con o senza taglio dei
+    silenzi) salvata in cache. Restituisce il percorso del file pronto e,
+    se c'è stato il taglio dei silenzi, la mappa degli offset.
+    """
+    source_path = blob_store.local_path(blob_key)
+    metadata = (probe_media(source_path) if source_path else None) or stored_metadata
+    plan = plan_encoding(metadata, size_bytes, force_transcode=use_vad)
+    logger.info(
+        f"🧭 Piano di codifica: {plan['mode']} {plan['profile'] or ''}, "
+        f"stima {plan['estimated_bytes']} byte in {plan['estimated_chunks']} chunk"
+    )
+
+    if plan["mode"] == "passthrough":
+        path = os.path.join(work_dir, f"source{plan['extension']}")
+        link_passthrough(blob_key, path)
+        return {"path": path, "offset_map": None, "plan": plan, "variant": "passthrough", "cache_hit": False}
+
+    profile = {
+        "output_args": plan["output_args"],
+        "channels": TARGET_CHANNELS,
+        "sample_rate": TARGET_SAMPLE_RATE,
+        "vad": {
+            "energy_db": vad.VAD_ENERGY_DB,
+            "zcr": vad.VAD_ZCR_THRESHOLD,
+            "min_silence": vad.VAD_MIN_SILENCE_SECONDS,
+            "padding": vad.VAD_PADDING_SECONDS,
+        } if use_vad else None,
+    }
+    cache_key = transcode_cache.make_key(blob_key, profile)
+    # Il job lavora su un proprio link all'artefatto: l'eviction della cache non lo tocca
+    path = os.path.join(work_dir, f"transcoded{plan['extension']}")
+    cached = transcode_cache.get(cache_key, plan["extension"])
+    if cached:
+        try:
+            transcode_cache.checkout(cached["path"], path)
+            return {"path": path, "offset_map": cached["meta"].get("offset_map"), "plan": plan,
+                    "variant": cache_key, "cache_hit": True}
+        except FileNotFoundError:
+            logger.info(f"💾 Artefatto {cache_key[:12]} rimosso dalla cache nel frattempo, nuova transcodifica")
+
+    tmp_path = transcode_cache.reserve(plan["extension"])
+    try:
+        if use_vad:
+            stats = vad.trim_silence(blob_key, tmp_path, plan["output_args"])
+            offset_map = stats["offset_map"]
+        else:
+            stats = transcode_blob(blob_key, tmp_path, plan["output_args"])
+            offset_map = None
+        transcode_cache.checkout(tmp_path, path)
+    except BaseException:
+        transcode_cache.discard(tmp_path)
+        raise
+
+    transcode_cache.put(cache_key, plan["extension"], tmp_path, {
+        "blob_key": blob_key,
+        "profile": profile,
+        "offset_map": offset_map,
+        "elapsed_seconds": stats["elapsed_seconds"],
+    })
+    return {"path": path, "offset_map": offset_map, "plan": plan, "variant": cache_key, "cache_hit": False}
+
+
+def offset_segments(segments: List[dict], offset: float) -> List[dict]:
+    """Riporta i timestamp dei segmenti di un chunk sulla timeline del file originale."""
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        segment["start"] = segment.get("start", 0.0) + offset
+        segment["end"] = segment.get("end", 0.0) + offset
+        shifted.append(segment)
+    return shifted
+
+
+def merge_chunk_results(chunk_results: List[dict]) -> dict:
+    """
+    Unisce i risultati dei chunk (ordinati per chunk_number) in un'unica
+    trascrizione, con segmenti rinumerati e timestamp assoluti.
+    """
+    texts = []
+    segments = []
+    for chunk in sorted(chunk_results, key=lambda c: c["chunk_number"]):
+        if chunk["transcription"]:
+            texts.append(chunk["transcription"].strip())
+        for segment in chunk["segments"]:
+            segment = dict(segment)
+            segment["id"] = len(segments)
+            segments.append(segment)
+
+    return {
+        "language": "it",
+        "segments": segments,
+        "transcription": " ".join(texts)
+    }
+
+
+async def transcribe_chunk(chunk: dict) -> dict:
+    """
+    Trascrive un chunk, o lo prende dalla cache dei risultati se lo stesso
+    intervallo dello stesso audio è già stato trascritto con gli stessi
+    parametri. Gli errori transitori rimasti dopo i ritentativi diventano
+    ChunkTranscriptionError (il task viene rimesso in coda con backoff);
+    CircuitOpenError e gli errori della richiesta passano invariati.
+    """
+    engine = get_engine(chunk.get("engine"))
+    duration = chunk["end"] - chunk["start"]
+    cache_key = None
+    result = None
+    if chunk.get("audio_sha256"):
+        cache_key = transcription_cache.make_key(
+            chunk["audio_sha256"], chunk["variant"], chunk["start"], chunk["end"], engine
+        )
+        result = await transcription_cache.get(cache_key)
+
+    if result is None:
+        started = time.monotonic()
+        try:
+            result = await transcribe_audio(chunk["path"], duration=duration, engine=engine.name)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                raise ChunkTranscriptionError(f"Chunk {chunk['chunk_number']}: {e}") from e
+            raise
+        if cache_key:
+            await transcription_cache.put(
+                cache_key, chunk["audio_sha256"], chunk["variant"], chunk["start"], chunk["end"],
+                engine, result, duration, time.monotonic() - started
+            )
+
+    return {
+        "chunk_number": chunk["chunk_number"],
+        "start": chunk["start"],
+        "end": chunk["end"],
+        "transcription": result.get("transcription") or "",
+        "segments": offset_segments(result.get("segments", []), chunk["start"]),
+    }
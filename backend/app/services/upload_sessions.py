@@ -0,0 +1,86 @@
+import os
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import logging
+from typing import AsyncIterator, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from app.services.blob_store import blob_store, BLOB_CHUNK_SIZE
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Cartella di appoggio per le parti degli upload multipart non ancora finalizzati
+UPLOAD_STAGING_ROOT = os.getenv("UPLOAD_STAGING_ROOT", os.path.join(os.getcwd(), "storage", "uploads"))
+
+
+def session_dir(session_id: str) -> str:
+    return os.path.join(UPLOAD_STAGING_ROOT, session_id)
+
+
+def part_path(session_id: str, part_number: int) -> str:
+    return os.path.join(session_dir(session_id), f"{part_number:06d}.part")
+
+
+async def write_part(session_id: str, part_number: int, chunks: AsyncIterator[bytes],
+                     expected_sha256: str) -> Tuple[int, str]:
+    """
+    Scrive una parte su disco a blocchi, calcolando lo SHA-256 al volo.
+    La parte diventa visibile (rename atomico) solo se il checksum coincide,
+    quindi parti diverse della stessa sessione possono arrivare in parallelo.
+    """
+    directory = session_dir(session_id)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                hasher.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(tmp_file.write, chunk)
+
+        digest = hasher.hexdigest()
+        if digest != expected_sha256.lower():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Checksum della parte {part_number} non valido: atteso {expected_sha256}, ricevuto {digest}"
+            )
+
+        os.replace(tmp_path, part_path(session_id, part_number))
+        return size, digest
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def assemble_parts(session_id: str, total_parts: int) -> Tuple[str, int]:
+    """
+    Concatena le parti in ordine direttamente nel blob store, a blocchi di
+    dimensione fissa: nessuna parte viene mai caricata per intero in memoria.
+    """
+    writer = blob_store.open_writer()
+    try:
+        for part_number in range(1, total_parts + 1):
+            with open(part_path(session_id, part_number), "rb") as part:
+                while True:
+                    chunk = part.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+        return writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def discard_session(session_id: str) -> None:
+    """Rimuove le parti in staging di una sessione."""
+    shutil.rmtree(session_dir(session_id), ignore_errors=True)
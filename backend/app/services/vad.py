@@ -0,0 +1,229 @@
+import os
+import time
+import bisect
+import logging
+import tempfile
+import subprocess
+from collections import deque
+from typing import List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from app.services.blob_store import blob_store
+from app.services.transcoder import (
+    FFMPEG_BIN, TARGET_SAMPLE_RATE, DEFAULT_OUTPUT_ARGS, TranscodeError
+)
+from app.utils.metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Attivazione di default del taglio dei silenzi (sovrascrivibile per singola richiesta)
+VAD_ENABLED = os.getenv("TRANSCRIPTION_VAD_ENABLED", "false").lower() == "true"
+
+# Soglie di analisi: energia in dBFS e zero-crossing rate per frame
+VAD_ENERGY_DB = float(os.getenv("VAD_ENERGY_DB", "-45"))
+VAD_ZCR_THRESHOLD = float(os.getenv("VAD_ZCR_THRESHOLD", "0.25"))
+# Solo i silenzi più lunghi di questa durata vengono rimossi
+VAD_MIN_SILENCE_SECONDS = float(os.getenv("VAD_MIN_SILENCE_SECONDS", "1.0"))
+# Margine di audio conservato ai bordi di ogni silenzio rimosso
+VAD_PADDING_SECONDS = float(os.getenv("VAD_PADDING_SECONDS", "0.2"))
+
+FRAME_SECONDS = 0.03
+FRAME_SAMPLES = int(TARGET_SAMPLE_RATE * FRAME_SECONDS)
+FRAME_BYTES = FRAME_SAMPLES * 2  # PCM s16le mono
+FRAMES_PER_READ = 100  # 3 secondi di audio per lettura
+
+
+def classify_frames(pcm: bytes) -> np.ndarray:
+    """
+    Classifica come parlato/non parlato una sequenza di frame PCM da 30 ms.
+    È parlato un frame con energia sopra soglia, oppure con energia appena
+    sotto soglia ma zero-crossing rate alto (consonanti sorde).
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    frames = samples[: len(samples) // FRAME_SAMPLES * FRAME_SAMPLES].reshape(-1, FRAME_SAMPLES)
+
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+    voiced = energy_db > VAD_ENERGY_DB
+    unvoiced = (energy_db > VAD_ENERGY_DB - 10) & (zcr > VAD_ZCR_THRESHOLD)
+    return voiced | unvoiced
+
+
+class _SilenceTrimmer:
+    """
+    Macchina a stati sui frame: i silenzi più lunghi di min_silence vengono
+    rimossi tranne `padding` frame ai bordi. La memoria usata è limitata a
+    min_silence frame, indipendentemente dalla durata del file.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.min_silence = max(int(VAD_MIN_SILENCE_SECONDS / FRAME_SECONDS), 1)
+        self.padding = min(int(VAD_PADDING_SECONDS / FRAME_SECONDS), self.min_silence // 2)
+        self.pending = []  # frame di silenzio non ancora decisi
+        self.tail = deque(maxlen=max(self.padding, 1))  # ultimi frame di un silenzio lungo
+        self.dropping = False
+        self.last_emitted = None
+        self.emitted_frames = 0
+        # Coppie (inizio nel file ridotto, inizio nel file originale) in secondi
+        self.offset_map: List[Tuple[float, float]] = []
+
+    def _emit(self, index: int, frame: bytes) -> None:
+        if self.last_emitted is None or index != self.last_emitted + 1:
+            self.offset_map.append((self.emitted_frames * FRAME_SECONDS, index * FRAME_SECONDS))
+        self.sink.write(frame)
+        self.last_emitted = index
+        self.emitted_frames += 1
+
+    def push(self, index: int, frame: bytes, is_speech: bool) -> None:
+        if is_speech:
+            if self.dropping:
+                if self.padding:
+                    for tail_index, tail_frame in self.tail:
+                        self._emit(tail_index, tail_frame)
+                self.tail.clear()
+                self.dropping = False
+            else:
+                for pending_index, pending_frame in self.pending:
+                    self._emit(pending_index, pending_frame)
+            self.pending = []
+            self._emit(index, frame)
+            return
+
+        if self.dropping:
+            self.tail.append((index, frame))
+            return
+
+        self.pending.append((index, frame))
+        if len(self.pending) >= self.min_silence:
+            # Silenzio lungo: si conserva solo il margine iniziale
+            for pending_index, pending_frame in self.pending[: self.padding]:
+                self._emit(pending_index, pending_frame)
+            self.tail.clear()
+            if self.padding:
+                self.tail.extend(self.pending[-self.padding:])
+            self.pending = []
+            self.dropping = True
+
+    def finish(self) -> None:
+        if not self.dropping:
+            for pending_index, pending_frame in self.pending:
+                self._emit(pending_index, pending_frame)
+        self.pending = []
+
+
+def trim_silence(blob_key: str, output_path: str, output_args: Optional[List[str]] = None) -> dict:
+    """
+    Decodifica il blob in PCM mono 16 kHz (ffmpeg -> stdout), rimuove le parti
+    senza parlato analizzando energia e zero-crossing con NumPy e ricodifica
+    al volo l'audio rimanente (stdin -> ffmpeg). Restituisce la mappa degli
+    offset per riportare i timestamp sulla timeline originale.
+    """
+    output_args = output_args or DEFAULT_OUTPUT_ARGS
+    local_path = blob_store.local_path(blob_key)
+    if not local_path:
+        raise TranscodeError("Il taglio dei silenzi richiede uno storage locale")
+
+    decode_cmd = [
+        FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-i", local_path,
+        "-vn", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-f", "s16le", "pipe:1"
+    ]
+    encode_cmd = [
+        FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "s16le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-i", "pipe:0",
+        *output_args, output_path
+    ]
+
+    started = time.monotonic()
+    with tempfile.TemporaryFile() as decode_err, tempfile.TemporaryFile() as encode_err:
+        decoder = subprocess.Popen(decode_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=decode_err)
+        encoder = subprocess.Popen(encode_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=encode_err)
+
+        trimmer = _SilenceTrimmer(encoder.stdin)
+        frame_index = 0
+        encoder_gone = False
+        try:
+            while True:
+                block = decoder.stdout.read(FRAME_BYTES * FRAMES_PER_READ)
+                if not block:
+                    break
+                usable = len(block) // FRAME_BYTES * FRAME_BYTES
+                speech = classify_frames(block[:usable])
+                for i, is_speech in enumerate(speech):
+                    frame = block[i * FRAME_BYTES:(i + 1) * FRAME_BYTES]
+                    trimmer.push(frame_index, frame, bool(is_speech))
+                    frame_index += 1
+            trimmer.finish()
+        except BrokenPipeError:
+            # L'encoder è uscito a metà: si smette di alimentarlo, l'errore (codice e stderr) lo riporta il controllo sotto
+            encoder_gone = True
+        finally:
+            # Ogni passo è indipendente: se l'encoder è già uscito, chiudere il suo stdin
+            # solleva BrokenPipeError, ma il decoder va comunque chiuso e atteso
+            for cleanup in (encoder.stdin.close, decoder.stdout.close, decoder.wait, encoder.wait):
+                try:
+                    cleanup()
+                except OSError as e:
+                    logger.warning(f"⚠️ Chiusura di ffmpeg non riuscita: {e}")
+
+        # Con l'encoder uscito a metà il decoder muore per la pipe chiusa: la causa è l'encoder
+        processes = ((encoder, encode_err), (decoder, decode_err)) if encoder_gone else \
+            ((decoder, decode_err), (encoder, encode_err))
+        for process, err_file in processes:
+            if process.returncode != 0 or (encoder_gone and process is encoder):
+                err_file.seek(0)
+                error = err_file.read().decode(errors="replace").strip()
+                metrics.incr("vad.errors")
+                raise TranscodeError(f"ffmpeg terminato con codice {process.returncode}: {error[-2000:]}")
+
+    original_seconds = frame_index * FRAME_SECONDS
+    kept_seconds = trimmer.emitted_frames * FRAME_SECONDS
+    stats = {
+        "elapsed_seconds": time.monotonic() - started,
+        "original_seconds": original_seconds,
+        "kept_seconds": kept_seconds,
+        "removed_ratio": 1 - kept_seconds / original_seconds if original_seconds else 0.0,
+        "output_bytes": os.path.getsize(output_path),
+        "offset_map": trimmer.offset_map,
+    }
+
+    metrics.incr("vad.runs")
+    metrics.incr("vad.removed_seconds", original_seconds - kept_seconds)
+    metrics.observe("vad.elapsed_seconds", stats["elapsed_seconds"])
+    logger.info(
+        f"🔇 VAD {blob_key[:12]}: {original_seconds:.0f}s -> {kept_seconds:.0f}s "
+        f"({stats['removed_ratio'] * 100:.1f}% rimosso) in {stats['elapsed_seconds']:.1f}s"
+    )
+    return stats
+
+
+def remap_timestamp(t: float, offset_map: List[Tuple[float, float]]) -> float:
+    """Riporta un istante del file ridotto sulla timeline del file originale."""
+    if not offset_map:
+        return t
+    starts = [entry[0] for entry in offset_map]
+    position = max(bisect.bisect_right(starts, t) - 1, 0)
+    trimmed_start, original_start = offset_map[position]
+    return original_start + (t - trimmed_start)
+
+
+def remap_chunk_results(chunk_results: List[dict], offset_map: List[Tuple[float, float]]) -> List[dict]:
+    """Riporta offset dei chunk e timestamp dei segmenti sulla timeline originale."""
+    remapped = []
+    for chunk in chunk_results:
+        chunk = dict(chunk)
+        chunk["start"] = remap_timestamp(chunk["start"], offset_map)
+        chunk["end"] = remap_timestamp(chunk["end"], offset_map)
+        segments = []
+        for segment in chunk["segments"]:
+            segment = dict(segment)
+            segment["start"] = remap_timestamp(segment["start"], offset_map)
+            segment["end"] = remap_timestamp(segment["end"], offset_map)
+            segments.append(segment)
+        chunk["segments"] = segments
+        remapped.append(chunk)
+    return remapped
@@ -0,0 +1 @@
+# Task Celery della pipeline di trascrizione e riassunto
@@ -0,0 +1,22 @@
+import asyncio
+from celery.signals import worker_process_init
+from app.database import engine
+
+# Un solo event loop per processo worker: connessioni al DB e client HTTP
+# restano legati allo stesso loop e vengono riutilizzati tra un task e l'altro.
+_loop = None
+
+
+def run_async(coro):
+    """Esegue una coroutine dal codice sincrono di un task Celery."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@worker_process_init.connect
+def _reset_db_pool(**kwargs):
+    # Dopo il fork il pool ereditato dal processo padre non va riutilizzato
+    engine.sync_engine.dispose(close=False)
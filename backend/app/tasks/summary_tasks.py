@@ -0,0 +1,179 @@
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+from app.celery_worker import celery
+from app.database import AsyncSessionLocal
+from app.models.tasks import TaskStatus
+from app.models.transcripts import Transcript
+from app.models.transcription_summaries import TranscriptionSummary
+from app.models.summary_llm_calls import SummaryLLMCall
+from app.models.summary_window_partials import SummaryWindowPartial
+from app.services.jobs import update_job, is_cancelled, JobCancelled
+from app.services.job_events import JobStreamWriter
+from app.services.resilience import CircuitOpenError
+from app.services.summarizer import generate_summary, summary_cache_key
+from app.tasks.runtime import run_async
+
+logger = logging.getLogger(__name__)
+
+
+async def _load_transcript_text(transcript_id: int) -> str:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Transcript.transcript_text).filter(Transcript.id == transcript_id))
+        text = result.scalar_one_or_none()
+
+    if not text:
+        raise ValueError(f"Testo della trascrizione {transcript_id} mancante")
+    return text
+
+
+async def _persist_summary(transcript_id: int, summary: str, cache_key: str) -> int:
+    async with AsyncSessionLocal() as db:
+        # Se nel frattempo la trascrizione è stata modificata il riassunto non va riusato
+        result = await db.execute(select(Transcript.transcript_text).filter(Transcript.id == transcript_id))
+        current_text = result.scalar_one_or_none()
+        new_summary = TranscriptionSummary(
+            transcript_id=transcript_id,
+            summary_text=summary,
+            cache_key=cache_key if current_text and summary_cache_key(current_text) == cache_key else None,
+            created_at=datetime.utcnow()
+        )
+        db.add(new_summary)
+        await db.commit()
+        return new_summary.id
+
+
+async def _record_call(job_id: int, transcript_id: int, call: dict) -> None:
+    async with AsyncSessionLocal() as db:
+        db.add(SummaryLLMCall(task_id=job_id, transcript_id=transcript_id, created_at=datetime.utcnow(), **call))
+        await db.commit()
+
+
+async def _load_partials(transcript_id: int) -> dict:
+    """Riassunti parziali delle finestre salvati dalle esecuzioni precedenti, per chiave di finestra."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(SummaryWindowPartial.window_key, SummaryWindowPartial.partial_text)
+            .filter(SummaryWindowPartial.transcript_id == transcript_id)
+        )
+        return {row.window_key: row.partial_text for row in result}
+
+
+async def _save_partial(transcript_id: int, window_key: str, partial: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            pg_insert(SummaryWindowPartial).values(
+                transcript_id=transcript_id,
+                window_key=window_key,
+                partial_text=partial,
+                created_at=datetime.utcnow()
+            ).on_conflict_do_nothing(constraint="uq_summary_window_partials_transcript_window")
+        )
+        await db.commit()
+
+
+async def _prune_partials(transcript_id: int, keep: list) -> None:
+    """Dopo un riassunto riuscito restano solo i parziali delle finestre attuali."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            delete(SummaryWindowPartial).where(
+                SummaryWindowPartial.transcript_id == transcript_id,
+                SummaryWindowPartial.window_key.notin_(keep)
+            )
+        )
+        await db.commit()
+
+
+def _callbacks(job_id: int, transcript_id: int, run: dict):
+    """
+    Callback del riassunto: piano salvato nei parametri del job (e in `run`),
+    avanzamento a passi (finestre del map-reduce, ogni passo controlla
+    l'annullamento), consumi di ogni chiamata salvati nel DB e sommati in
+    run["usage"], riassunti parziali delle finestre salvati appena pronti
+    (un job fallito a metà non li perde).
+    """
+    async def on_plan(plan: dict) -> None:
+        run["plan"] = plan
+        await update_job(job_id, steps_total=plan["steps"], params={"plan": plan})
+
+    async def on_step() -> None:
+        if await is_cancelled(job_id):
+            raise JobCancelled(f"Job {job_id} annullato")
+        await update_job(job_id, step_done=True)
+
+    async def on_call(call: dict) -> None:
+        usage = run["usage"]
+        usage["calls"] += 1
+        usage["prompt_tokens"] += call["prompt_tokens"]
+        usage["completion_tokens"] += call["completion_tokens"]
+        await _record_call(job_id, transcript_id, call)
+
+    async def on_partial(window_key: str, partial: str) -> None:
+        await _save_partial(transcript_id, window_key, partial)
+
+    return on_plan, on_step, on_call, on_partial
+
+
+@celery.task(bind=True, name="summary.generate", max_retries=None)
+def summarize_transcript(self, job_id: int, transcript_id: int) -> dict:
+    """Genera il riassunto di una trascrizione e lo salva, aggiornando il job."""
+    if run_async(is_cancelled(job_id)):
+        logger.info(f"🛑 Job di riassunto {job_id} annullato prima dell'avvio")
+        return None
+
+    try:
+        run_async(update_job(job_id, stage="summarizing"))
+        run = {"plan": None, "usage": {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}}
+        on_plan, on_step, on_call, on_partial = _callbacks(job_id, transcript_id, run)
+        # Il testo del riassunto arriva ai client in streaming (SSE /jobs/{id}/events) mentre viene generato
+        stream_writer = JobStreamWriter(job_id)
+        transcript_text = run_async(_load_transcript_text(transcript_id))
+        summary = run_async(generate_summary(
+            transcript_text,
+            on_plan=on_plan, on_step=on_step, on_call=on_call, on_delta=stream_writer.write,
+            # Solo le finestre modificate dall'ultimo riassunto vengono ririassunte
+            cached_partials=run_async(_load_partials(transcript_id)), on_partial=on_partial
+        ))
+        run_async(stream_writer.flush())
+        window_keys = run["plan"].get("window_keys")
+        if window_keys:
+            # Solo con il map-reduce: un testo rientrato in una finestra conserva i parziali per le prossime modifiche
+            run_async(_prune_partials(transcript_id, window_keys))
+
+        if run_async(is_cancelled(job_id)):
+            # Annullato durante la generazione: il riassunto non viene salvato
+            logger.info(f"🛑 Job di riassunto {job_id} annullato")
+            return None
+
+        run_async(update_job(job_id, stage="persisting"))
+        summary_id = run_async(_persist_summary(transcript_id, summary, summary_cache_key(transcript_text)))
+    except JobCancelled:
+        logger.info(f"🛑 Job di riassunto {job_id} annullato")
+        return None
+    except CircuitOpenError as e:
+        # Provider degradato: il job resta in coda e riparte alla riapertura del circuito
+        logger.warning(f"⏸️ Job di riassunto {job_id} rimandato: {e}")
+        raise self.retry(exc=e, countdown=e.retry_after)
+    except Exception as e:
+        logger.error(f"❌ Job di riassunto {job_id} fallito: {e}")
+        run_async(update_job(job_id, status=TaskStatus.failed, error_message=str(e)))
+        raise
+
+    result = {
+        "summary_id": summary_id,
+        "transcript_id": transcript_id,
+        "usage": run["usage"],
+        "windows": run["plan"]["windows"],
+        "windows_reused": run["plan"].get("windows_reused", 0),
+    }
+    run_async(update_job(
+        job_id,
+        status=TaskStatus.completed,
+        transcript_id=transcript_id,
+        result=json.dumps(result)
+    ))
+    logger.info(f"✅ Riassunto salvato con ID: {summary_id}")
+    return result
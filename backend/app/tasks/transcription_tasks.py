@@ -0,0 +1,353 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+from datetime import datetime
+from typing import Optional
+from celery import chain, chord
+from celery.utils.time import get_exponential_backoff_interval
+from dotenv import load_dotenv
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+from app.celery_worker import celery
+from app.database import AsyncSessionLocal
+from app.models.audio_files import AudioFile
+from app.models.tasks import Task, TaskStatus
+from app.models.transcripts import Transcript
+from app.models.transcription_chunks import TranscriptionChunk
+from app.services.chunker import plan_split, cut_chunks
+from app.services.jobs import update_job, is_cancelled, JobCancelled
+from app.services.transcription_pipeline import (
+    prepare_audio, transcribe_chunk, merge_chunk_results, ChunkTranscriptionError
+)
+from app.services.resilience import CircuitOpenError
+from app.services.transcription_cache import transcription_cache
+from app.services.transcription_engines import get_engine
+from app.services.vad import remap_chunk_results
+from app.tasks.runtime import run_async
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Cartella di lavoro condivisa tra i worker (chunk da trascrivere)
+TRANSCRIPTION_WORK_DIR = os.getenv("TRANSCRIPTION_WORK_DIR", os.path.join(os.getcwd(), "storage", "work"))
+# Nuovi tentativi di un chunk dopo un errore transitorio (le attese per il circuito aperto non contano)
+CHUNK_MAX_RETRIES = 3
+
+
+def _ensure_active(job_id: int) -> None:
+    """Controllo cooperativo: ogni fase e ogni chunk si fermano se il job è stato annullato."""
+    if run_async(is_cancelled(job_id)):
+        raise JobCancelled(f"Job {job_id} annullato")
+
+
+def _routing(context: dict) -> dict:
+    return {"queue": context["queue"], "priority": context["priority"]}
+
+
+async def _load_audio(audio_file_id: int) -> dict:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(
+                AudioFile.blob_key, AudioFile.size_bytes, AudioFile.duration_seconds,
+                AudioFile.codec, AudioFile.channels, AudioFile.sample_rate, AudioFile.bit_rate
+            ).filter(AudioFile.id == audio_file_id)
+        )
+        row = result.one_or_none()
+
+    if row is None:
+        raise ValueError(f"File audio {audio_file_id} non trovato")
+    return dict(row._mapping)
+
+
+@celery.task(name="transcription.transcode")
+def transcode_audio(context: dict) -> dict:
+    """Prima fase: piano di codifica e conversione (o artefatto dalla cache)."""
+    _ensure_active(context["job_id"])
+    run_async(update_job(context["job_id"], stage="transcoding"))
+    audio = run_async(_load_audio(context["audio_file_id"]))
+    os.makedirs(context["work_dir"], exist_ok=True)
+
+    prepared = prepare_audio(
+        audio["blob_key"],
+        audio["size_bytes"],
+        {key: audio[key] for key in ("duration_seconds", "codec", "channels", "sample_rate", "bit_rate")},
+        context["work_dir"],
+        context["use_vad"]
+    )
+    logger.info(f"✅ Audio {context['audio_file_id']} pronto: {prepared['plan']['mode']}, cache hit={prepared['cache_hit']}")
+    return {
+        **context,
+        "audio_path": prepared["path"],
+        "offset_map": prepared["offset_map"],
+        "blob_key": audio["blob_key"],
+        "audio_variant": prepared["variant"],
+    }
+
+
+async def _load_checkpoint(job_id: int):
+    """Piano dei chunk salvato nel job e numeri dei chunk già trascritti."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Task.chunk_plan).filter(Task.id == job_id))
+        chunk_plan = result.scalar_one_or_none()
+        result = await db.execute(
+            select(TranscriptionChunk.chunk_number).filter(TranscriptionChunk.task_id == job_id)
+        )
+        done = set(result.scalars().all())
+    return chunk_plan, done
+
+
+@celery.task(name="transcription.split")
+def split_chunks(context: dict) -> dict:
+    """
+    Seconda fase: divisione sui silenzi in chunk sotto il limite dell'API.
+    Il piano dei tagli viene salvato nel job alla prima esecuzione: un job
+    ripreso riusa gli stessi tagli ed estrae solo i chunk non ancora trascritti.
+    """
+    _ensure_active(context["job_id"])
+    run_async(update_job(context["job_id"], stage="splitting"))
+    chunk_plan, done = run_async(_load_checkpoint(context["job_id"]))
+    if chunk_plan is None:
+        chunk_plan = [list(interval) for interval in plan_split(context["audio_path"])]
+        run_async(update_job(context["job_id"], chunk_plan=chunk_plan))
+
+    chunks = cut_chunks(context["audio_path"], context["work_dir"], chunk_plan, skip=done)
+    logger.info(
+        f"✂️ Audio {context['audio_file_id']} diviso in {len(chunk_plan)} chunk, "
+        f"{len(done)} già trascritti"
+    )
+    return {**context, "chunks": chunks, "chunks_total": len(chunk_plan), "chunks_done": len(done)}
+
+
+@celery.task(bind=True, name="transcription.fan_out")
+def fan_out_transcription(self, context: dict):
+    """
+    Terza fase: un task per chunk mancante, eseguiti in parallelo dai worker
+    disponibili, con la fase di unione e salvataggio come callback del chord.
+    I task dei chunk ereditano coda e priorità del job.
+    """
+    _ensure_active(context["job_id"])
+    run_async(update_job(
+        context["job_id"],
+        stage="transcribing",
+        steps_done=context["chunks_done"],
+        steps_total=context["chunks_total"]
+    ))
+    body_context = {key: value for key, value in context.items() if key != "chunks"}
+    if not context["chunks"]:
+        # Tutti i chunk sono già nei checkpoint: resta solo l'unione
+        raise self.replace(persist_transcription.s([], body_context).set(**_routing(context)))
+
+    # Motore e identità dell'audio servono al chunk per la cache dei risultati
+    chunk_fields = {
+        "engine": context.get("engine"),
+        "audio_sha256": context.get("blob_key"),
+        "variant": context.get("audio_variant"),
+    }
+    header = [
+        transcribe_chunk_task.s({**chunk, **chunk_fields}, context["job_id"]).set(**_routing(context))
+        for chunk in context["chunks"]
+    ]
+    raise self.replace(chord(header, persist_transcription.s(body_context).set(**_routing(context))))
+
+
+async def _chunk_done(job_id: int, chunk_number: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(TranscriptionChunk.id).filter(
+                TranscriptionChunk.task_id == job_id,
+                TranscriptionChunk.chunk_number == chunk_number
+            )
+        )
+        return result.scalar_one_or_none() is not None
+
+
+async def _save_checkpoint(job_id: int, chunk_result: dict) -> bool:
+    """Salva il risultato di un chunk appena trascritto; False se era già salvato."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            pg_insert(TranscriptionChunk).values(
+                task_id=job_id,
+                chunk_number=chunk_result["chunk_number"],
+                chunk_text=chunk_result["transcription"],
+                start_time=chunk_result["start"],
+                end_time=chunk_result["end"],
+                segments=chunk_result["segments"],
+                created_at=datetime.utcnow()
+            ).on_conflict_do_nothing(constraint="uq_transcription_chunks_task_chunk")
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+
+@celery.task(bind=True, name="transcription.chunk", max_retries=None)
+def transcribe_chunk_task(self, chunk: dict, job_id: int, circuit_waits: int = 0) -> dict:
+    """
+    Trascrive un chunk e lo salva subito come checkpoint. Se il messaggio
+    viene riconsegnato (worker caduto) e il chunk è già salvato, non lo
+    ritrascrive. Il risultato resta nel DB: il chord trasporta solo il numero.
+    Un job annullato non spende altre chiamate all'API.
+
+    `circuit_waits` conta i rinvii per circuito aperto: Celery li somma ai
+    tentativi in `request.retries`, quindi il limite degli errori del chunk
+    si applica alla differenza.
+    """
+    _ensure_active(job_id)
+    if run_async(_chunk_done(job_id, chunk["chunk_number"])):
+        return {"chunk_number": chunk["chunk_number"]}
+
+    try:
+        result = run_async(transcribe_chunk(chunk))
+    except CircuitOpenError as e:
+        # Provider degradato: il chunk torna in coda fino alla riapertura del circuito,
+        # senza consumare i tentativi riservati agli errori del chunk
+        raise self.retry(
+            exc=e, countdown=e.retry_after,
+            kwargs={**self.request.kwargs, "circuit_waits": circuit_waits + 1}
+        )
+    except ChunkTranscriptionError as e:
+        chunk_retries = self.request.retries - circuit_waits
+        if chunk_retries >= CHUNK_MAX_RETRIES:
+            raise
+        countdown = get_exponential_backoff_interval(factor=1, retries=chunk_retries, maximum=600, full_jitter=True)
+        raise self.retry(exc=e, countdown=countdown)
+    if run_async(_save_checkpoint(job_id, result)):
+        run_async(update_job(job_id, step_done=True))
+    return {"chunk_number": chunk["chunk_number"]}
+
+
+async def _persist(context: dict) -> dict:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(TranscriptionChunk)
+            .filter(TranscriptionChunk.task_id == context["job_id"])
+            .order_by(TranscriptionChunk.chunk_number)
+        )
+        rows = result.scalars().all()
+
+        # Unione già completata da un'esecuzione precedente interrotta prima della conferma
+        existing = next((row.transcript_id for row in rows if row.transcript_id), None)
+        if existing:
+            return {"transcript_id": existing, "segments_count": sum(len(row.segments or []) for row in rows),
+                    "chunks_count": len(rows)}
+
+        if len(rows) != context["chunks_total"]:
+            raise ValueError(f"Checkpoint incompleti: {len(rows)} chunk su {context['chunks_total']}")
+
+        # Secondi di audio effettivamente trascritti (timeline dei chunk, prima della rimappatura)
+        audio_seconds = sum(row.end_time - row.start_time for row in rows)
+        chunk_results = [
+            {
+                "chunk_number": row.chunk_number,
+                "start": row.start_time,
+                "end": row.end_time,
+                "transcription": row.chunk_text,
+                "segments": row.segments or [],
+            }
+            for row in rows
+        ]
+        if context.get("offset_map"):
+            chunk_results = remap_chunk_results(chunk_results, context["offset_map"])
+        result_json = merge_chunk_results(chunk_results)
+
+        if not result_json["transcription"]:
+            raise ValueError("Trascrizione vuota dalla API")
+
+        new_transcript = Transcript(
+            audio_id=context["audio_file_id"],
+            transcript_text=result_json["transcription"],
+            segments=result_json["segments"],
+            created_at=datetime.utcnow()
+        )
+        db.add(new_transcript)
+        await db.flush()
+
+        # I checkpoint diventano i chunk della trascrizione, con i tempi sulla timeline originale
+        for row, chunk in zip(rows, chunk_results):
+            row.transcript_id = new_transcript.id
+            row.start_time = chunk["start"]
+            row.end_time = chunk["end"]
+            row.segments = chunk["segments"]
+
+        await db.commit()
+
+        result = await db.execute(select(Task.started_at).filter(Task.id == context["job_id"]))
+        started_at = result.scalar_one_or_none()
+        transcript_id = new_transcript.id
+
+    if context.get("blob_key"):
+        # Trascrizione completa in cache: lo stesso audio non passa più dai worker
+        engine = get_engine(context.get("engine"))
+        await transcription_cache.put(
+            transcription_cache.make_file_key(context["blob_key"], context["use_vad"], engine),
+            context["blob_key"], f"file:vad={int(context['use_vad'])}", None, None, engine, result_json,
+            audio_seconds=audio_seconds,
+            elapsed_seconds=(datetime.utcnow() - started_at).total_seconds() if started_at else 0.0
+        )
+
+    return {"transcript_id": transcript_id, "segments_count": len(result_json["segments"]),
+            "chunks_count": len(rows)}
+
+
+@celery.task(name="transcription.persist")
+def persist_transcription(chunk_results: list, context: dict) -> dict:
+    """Ultima fase: unione dei checkpoint dei chunk, salvataggio del Transcript."""
+    _ensure_active(context["job_id"])
+    run_async(update_job(context["job_id"], stage="persisting"))
+    try:
+        persisted = run_async(_persist(context))
+    finally:
+        shutil.rmtree(context["work_dir"], ignore_errors=True)
+
+    logger.info(f"✅ Transcript salvato con ID: {persisted['transcript_id']}")
+    result = {**persisted, "audio_file_id": context["audio_file_id"]}
+    run_async(update_job(
+        context["job_id"],
+        status=TaskStatus.completed,
+        transcript_id=persisted["transcript_id"],
+        result=json.dumps(result)
+    ))
+    return result
+
+
+@celery.task(name="transcription.failed")
+def fail_transcription_job(request, exc, traceback, job_id: int, work_dir: str):
+    """Errback della pipeline: segna il job come fallito e ripulisce la cartella di lavoro."""
+    shutil.rmtree(work_dir, ignore_errors=True)
+    if isinstance(exc, JobCancelled):
+        logger.info(f"🛑 Job di trascrizione {job_id} annullato")
+        return
+    logger.error(f"❌ Job di trascrizione {job_id} fallito: {exc}")
+    run_async(update_job(job_id, status=TaskStatus.failed, error_message=str(exc)))
+
+
+def start_transcription_job(job_id: int, audio_file_id: int, use_vad: bool,
+                            queue: str = "interactive", priority: int = 5, engine: Optional[str] = None) -> str:
+    """
+    Accoda la pipeline transcodifica -> divisione -> trascrizione parallela ->
+    unione e salvataggio per il job `job_id`, sulla coda e con la priorità
+    indicate, usando il motore di trascrizione `engine` (None = quello di
+    default). Restituisce gli id Celery dei task del chain, dal primo
+    all'ultimo, separati da virgole: un annullamento li revoca tutti.
+    Per un job già avviato in precedenza la pipeline riparte dai checkpoint.
+    """
+    work_dir = os.path.join(TRANSCRIPTION_WORK_DIR, str(uuid.uuid4()))
+    context = {
+        "job_id": job_id, "audio_file_id": audio_file_id, "use_vad": use_vad, "work_dir": work_dir,
+        "queue": queue, "priority": priority, "engine": engine,
+    }
+    routing = _routing(context)
+
+    pipeline = chain(
+        transcode_audio.s(context).set(**routing),
+        split_chunks.s().set(**routing),
+        fan_out_transcription.s().set(**routing),
+    )
+    result = pipeline.apply_async(link_error=fail_transcription_job.s(job_id=job_id, work_dir=work_dir))
+    celery_ids = []
+    while result is not None:
+        celery_ids.insert(0, result.id)
+        result = result.parent
+    return ",".join(celery_ids)
@@ -0,0 +1,115 @@
+import asyncio
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Optional, Tuple
+from starlette.responses import Response
+
+# Blocchi letti quando il server non supporta l'invio zero-copy
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range "bytes=..." e restituisce (inizio, fine) inclusivi.
+    Restituisce None se l'header va ignorato (unità diversa o range multipli:
+    in quel caso si risponde con il file intero, come consentito dalla RFC 9110).
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    if size == 0:
+        # Nessun range è soddisfacibile su un file vuoto (un suffisso darebbe "bytes 0--1/0")
+        raise RangeNotSatisfiable()
+
+    start_str, _, end_str = spec.strip().partition("-")
+    try:
+        if start_str == "":
+            # Suffisso: ultimi N byte
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value, usegmt=True)
+
+
+def parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def etag_matches(header_value: str, etag: str) -> bool:
+    """Confronto debole degli ETag per If-None-Match (ignora il prefisso W/)."""
+    if header_value.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header_value.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+class BlobStreamResponse(Response):
+    """
+    Risposta che invia una porzione di un file: se il server ASGI supporta
+    l'estensione "http.response.zerocopysend" i byte passano dal kernel
+    (sendfile) senza essere copiati in Python, altrimenti vengono letti a
+    blocchi in un thread. In nessun caso il file viene caricato per intero.
+    """
+
+    def __init__(self, open_file: Callable[[], BinaryIO], offset: int, length: int,
+                 status_code: int = 200, headers: Optional[dict] = None, media_type: Optional[str] = None):
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.open_file = open_file
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with self.open_file() as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            await asyncio.to_thread(file.seek, self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(file.read, min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
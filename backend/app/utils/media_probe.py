@@ -0,0 +1,43 @@
+import json
+import logging
+import subprocess
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+FFPROBE_BIN = "ffprobe"
+
+
+def probe_media(path: str, timeout: int = 60) -> Optional[dict]:
+    """
+    Legge con ffprobe i metadati del primo stream audio (durata, codec,
+    canali, frequenza di campionamento, bitrate) senza decodificare il file.
+    Restituisce None se il file non è leggibile.
+    """
+    cmd = [
+        FFPROBE_BIN, "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "format=duration,bit_rate,format_name:stream=codec_name,channels,sample_rate,duration",
+        "-of", "json",
+        path
+    ]
+    try:
+        completed = subprocess.run(cmd, capture_output=True, timeout=timeout, check=True)
+        data = json.loads(completed.stdout or b"{}")
+    except (subprocess.SubprocessError, OSError, json.JSONDecodeError) as e:
+        logger.warning(f"⚠️ ffprobe non riuscito su {path}: {e}")
+        return None
+
+    streams = data.get("streams") or [{}]
+    stream = streams[0]
+    fmt = data.get("format", {})
+
+    duration = stream.get("duration") or fmt.get("duration")
+    return {
+        "duration_seconds": float(duration) if duration else None,
+        "codec": stream.get("codec_name"),
+        "channels": stream.get("channels"),
+        "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+        "bit_rate": int(fmt["bit_rate"]) if fmt.get("bit_rate") else None,
+        "format_name": fmt.get("format_name"),
+    }
@@ -0,0 +1,163 @@
+import os
+import json
+import logging
+import threading
+from collections import defaultdict
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+# Intervallo con cui ogni processo (API o worker Celery) invia a Redis le metriche raccolte
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_KEY_PREFIX = "metrics:"
+
+# Massimo delle osservazioni aggiornato in modo atomico su Redis
+_MAX_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current or tonumber(current) < tonumber(ARGV[2]) then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+"""
+
+
+class MetricsRegistry:
+    """
+    Registro minimale delle metriche: contatori, gauge e osservazioni
+    (conteggio, somma, massimo). I valori si accumulano in memoria e un
+    thread li invia a Redis ogni `flush_seconds`, così GET /metrics (processo
+    API) somma anche quanto registrato dai worker Celery. Per i gauge vale
+    l'ultimo valore inviato da un qualsiasi processo. Se Redis non risponde,
+    i valori restano in attesa del prossimo invio e /metrics mostra quelli
+    del processo.
+    """
+
+    def __init__(self, redis_url: str, flush_seconds: float):
+        self.redis_url = redis_url
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        # Totali del processo
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._observations = {}
+        # Variazioni non ancora inviate a Redis
+        self._pending_counters = defaultdict(float)
+        self._pending_gauges = {}
+        self._pending_observations = {}
+        self._client = None
+        self._flusher_pid = None
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.redis_url)
+            self._max_script = self._client.register_script(_MAX_SCRIPT)
+        return self._client
+
+    def _ensure_flusher(self) -> None:
+        # Avviato al primo uso in ogni processo: i figli dei worker prefork non ereditano il thread
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        self._flusher_pid = pid
+        self._client = None
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._ensure_flusher()
+            self._counters[name] += value
+            self._pending_counters[name] += value
+
+    def gauge(self, name: str, value) -> None:
+        with self._lock:
+            self._ensure_flusher()
+            self._gauges[name] = value
+            self._pending_gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self._ensure_flusher()
+            for observations in (self._observations, self._pending_observations):
+                stats = observations.setdefault(name, {"count": 0, "sum": 0.0, "max": None})
+                stats["count"] += 1
+                stats["sum"] += value
+                stats["max"] = value if stats["max"] is None else max(stats["max"], value)
+
+    def _flush_loop(self) -> None:
+        stop = threading.Event()
+        while not stop.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        """Invia a Redis le variazioni raccolte; se l'invio fallisce le rimette in attesa."""
+        with self._lock:
+            counters, self._pending_counters = self._pending_counters, defaultdict(float)
+            gauges, self._pending_gauges = self._pending_gauges, {}
+            observations, self._pending_observations = self._pending_observations, {}
+        if not (counters or gauges or observations):
+            return
+
+        try:
+            client = self._redis()
+            pipe = client.pipeline(transaction=False)
+            for name, value in counters.items():
+                pipe.hincrbyfloat(f"{METRICS_KEY_PREFIX}counters", name, value)
+            for name, value in gauges.items():
+                pipe.hset(f"{METRICS_KEY_PREFIX}gauges", name, json.dumps(value))
+            for name, stats in observations.items():
+                pipe.hincrby(f"{METRICS_KEY_PREFIX}observations", f"{name}:count", stats["count"])
+                pipe.hincrbyfloat(f"{METRICS_KEY_PREFIX}observations", f"{name}:sum", stats["sum"])
+                self._max_script(keys=[f"{METRICS_KEY_PREFIX}observations"],
+                                 args=[f"{name}:max", stats["max"]], client=pipe)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Invio metriche a Redis non riuscito: {e}")
+            with self._lock:
+                for name, value in counters.items():
+                    self._pending_counters[name] += value
+                for name, value in gauges.items():
+                    self._pending_gauges.setdefault(name, value)
+                for name, stats in observations.items():
+                    pending = self._pending_observations.setdefault(name, {"count": 0, "sum": 0.0, "max": None})
+                    pending["count"] += stats["count"]
+                    pending["sum"] += stats["sum"]
+                    pending["max"] = stats["max"] if pending["max"] is None else max(pending["max"], stats["max"])
+
+    def _local_snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "observations": {name: dict(stats) for name, stats in self._observations.items()},
+            }
+
+    def snapshot(self) -> dict:
+        """Metriche di tutti i processi (da Redis), o del solo processo corrente se Redis non risponde."""
+        self.flush()
+        try:
+            client = self._redis()
+            counters = client.hgetall(f"{METRICS_KEY_PREFIX}counters")
+            gauges = client.hgetall(f"{METRICS_KEY_PREFIX}gauges")
+            raw_observations = client.hgetall(f"{METRICS_KEY_PREFIX}observations")
+        except Exception as e:
+            logger.warning(f"⚠️ Lettura metriche da Redis non riuscita: {e}")
+            return {**self._local_snapshot(), "scope": "process"}
+
+        observations = {}
+        for field, value in raw_observations.items():
+            name, stat = field.decode().rsplit(":", 1)
+            stats = observations.setdefault(name, {"count": 0, "sum": 0.0, "max": None})
+            stats[stat] = int(value) if stat == "count" else float(value)
+        return {
+            "counters": {name.decode(): float(value) for name, value in counters.items()},
+            "gauges": {name.decode(): json.loads(value) for name, value in gauges.items()},
+            "observations": observations,
+            "scope": "cluster",
+        }
+
+
+# 🔹 Istanza globale delle metriche
+metrics = MetricsRegistry(REDIS_URL, METRICS_FLUSH_SECONDS)
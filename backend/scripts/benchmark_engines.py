@@ -0,0 +1,73 @@
+"""
+Confronto dei motori di trascrizione sull'hardware corrente.
+
+    python -m scripts.benchmark_engines --engines openai,local --concurrency 4 audio1.ogg audio2.ogg
+
+Per ogni motore trascrive tutti i file (con `--concurrency` richieste
+contemporanee) e riporta:
+- RTF (real-time factor): secondi di calcolo per secondo di audio, per file;
+- throughput: secondi di audio trascritti per secondo di orologio;
+- latenza per file (mediana e massima).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from app.services.transcription_engines import get_engine
+from app.utils.media_probe import probe_media
+
+
+async def _run_engine(name: str, files: list, durations: dict, concurrency: int) -> dict:
+    engine = get_engine(name)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {}
+
+    async def transcribe(path: str):
+        async with semaphore:
+            started = time.perf_counter()
+            await engine.transcribe(path, durations[path])
+            latencies[path] = time.perf_counter() - started
+
+    # Riscaldamento: caricamento del modello locale / apertura delle connessioni
+    await engine.transcribe(files[0], durations[files[0]])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(transcribe(path) for path in files))
+    wall = time.perf_counter() - started
+
+    audio_seconds = sum(durations.values())
+    return {
+        "engine": engine.model_id,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": wall,
+        "rtf": statistics.mean(latencies[path] / durations[path] for path in files),
+        "throughput": audio_seconds / wall,
+        "latency_p50": statistics.median(latencies.values()),
+        "latency_max": max(latencies.values()),
+    }
+
+
+async def main(args) -> None:
+    durations = {}
+    for path in args.files:
+        metadata = probe_media(path)
+        if not metadata or not metadata["duration_seconds"]:
+            raise SystemExit(f"❌ Durata non leggibile: {path}")
+        durations[path] = metadata["duration_seconds"]
+
+    print(f"{'motore':<28}{'audio s':>10}{'orologio s':>12}{'RTF':>8}{'audio s/s':>11}{'p50 s':>9}{'max s':>9}")
+    for name in args.engines.split(","):
+        report = await _run_engine(name, args.files, durations, args.concurrency)
+        print(
+            f"{report['engine']:<28}{report['audio_seconds']:>10.0f}{report['wall_seconds']:>12.1f}"
+            f"{report['rtf']:>8.3f}{report['throughput']:>11.2f}"
+            f"{report['latency_p50']:>9.1f}{report['latency_max']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dei motori di trascrizione")
+    parser.add_argument("files", nargs="+", help="file audio da trascrivere")
+    parser.add_argument("--engines", default="openai,local", help="motori da confrontare, separati da virgola")
+    parser.add_argument("--concurrency", type=int, default=4, help="trascrizioni contemporanee per motore")
+    asyncio.run(main(parser.parse_args()))
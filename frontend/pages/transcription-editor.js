@@ -13,6 +13,7 @@ import { FaCheckCircle } from "react-icons/fa";
 import { AiOutlineLoading3Quarters } from "react-icons/ai";
 import Toolbar from "../components/Editor-toolbar";
 import OneDriveButton from '../components/OneDriveButton';
+import { followJob } from '../utils/jobs';
 import { useOneDrive } from '../context/OneDriveContext';
 
 const TranscriptionEditor = () => {
@@ -24,6 +25,7 @@ const TranscriptionEditor = () => {
     const [socket, setSocket] = useState(null);
     const [notifications, setNotifications] = useState([]);
     const [progress, setProgress] = useState(null);
+    const [summaryPreview, setSummaryPreview] = useState('');
     const { isAuthenticated } = useOneDrive();
 
     useEffect(() => {
@@ -165,8 +167,13 @@ const TranscriptionEditor = () => {
             if(response.ok){
                 const data = await response.json();
                 console.log('risposta --> ', data);
+                // Trascrizione invariata: il riassunto esistente si apre subito.
+                // Altrimenti il riassunto compare man mano che viene generato, poi si apre l'editor
+                const result = data.cached
+                    ? data
+                    : await followJob(data.job_id, { onText: setSummaryPreview });
                 router.push(
-                    `/summary-editor?summary_id=${data}`
+                    `/summary-editor?summary_id=${result.summary_id}`
                   );
             }
         } catch(e){
@@ -231,6 +238,11 @@ const TranscriptionEditor = () => {
                 <div className={styles.editorBox}>
                     <EditorContent editor={editor} />
                 </div>
+                {summaryPreview && (
+                    <div className={styles.editorBox} style={{ whiteSpace: "pre-wrap" }}>
+                        {summaryPreview}
+                    </div>
+                )}
                 <div className={styles.buttonsContainer}>
                     <button onClick={() => handleWordAction("download")} className={styles.saveButton}>
                         Scarica come .docx
@@ -5,11 +5,13 @@ import { FaCheckCircle } from "react-icons/fa";
 import { AiOutlineLoading3Quarters } from "react-icons/ai";
 import OneDriveButton from '../components/OneDriveButton';
 import { useOneDrive } from '../context/OneDriveContext';
+import { waitForJob } from '../utils/jobs';
 
 const UploadPage = () => {
   const [audioFile, setAudioFile] = useState(null);
   const [audioPreview, setAudioPreview] = useState(null);
   const [audioFileId, setAudioFileId] = useState(null);
+  const [existingTranscriptId, setExistingTranscriptId] = useState(null);
   const [isTranscribing, setIsTranscribing] = useState(false);
   const [messages, setMessages] = useState([]);
   const [ws, setWs] = useState(null);
@@ -92,6 +94,9 @@ const UploadPage = () => {
 
         // Imposta l'ID del file audio appena caricato
         setAudioFileId(data.audio_file_id);
+
+        // File già caricato in precedenza: se esiste già una trascrizione la riutilizziamo
+        setExistingTranscriptId(data.duplicate ? data.transcript_id : null);
       } else {
         alert("Errore durante il caricamento del file.");
       }
@@ -101,6 +106,14 @@ const UploadPage = () => {
     }
   };
 
+  // Attende la fine del job di trascrizione e restituisce l'ID della trascrizione
+  const waitForTranscription = async (jobId) => {
+    const result = await waitForJob(jobId, (job) =>
+      console.log(`⏳ Trascrizione: ${job.stage} ${job.progress}%`)
+    );
+    return result.transcript_id;
+  };
+
   // Invia una richiesta al backend per avviare la trascrizione
   const handleStartTranscription = async () => {
     if (!audioFileId) {
@@ -108,6 +121,11 @@ const UploadPage = () => {
       return;
     }
 
+    if (existingTranscriptId) {
+      router.push(`/transcription-editor?transcript_id=${existingTranscriptId}`);
+      return;
+    }
+
     setIsTranscribing(true); 
 
     try {
@@ -120,13 +138,17 @@ const UploadPage = () => {
 
       if (response.ok) {
         const data = await response.json();
-        console.log("transcript_id: ", data.transcript_id);
+        console.log("job_id: ", data.job_id);
+        setProgress("Trascrizione in corso...");
+
+        const transcriptId = await waitForTranscription(data.job_id);
+        console.log("transcript_id: ", transcriptId);
         setProgress("Reindirizzo alla pagina editor...");
 
         // attende 2 secondi prima di reindirizzare
         setTimeout(() => {
             router.push(
-                `/transcription-editor?transcript_id=${data.transcript_id}`
+                `/transcription-editor?transcript_id=${transcriptId}`
               );
         }, 2500);
 
@@ -0,0 +1,70 @@
+// Attende la fine di un job (trascrizione o riassunto) con long-poll su /jobs/{id}/wait:
+// il backend risponde appena lo stato cambia, senza richieste a intervallo fisso.
+// onProgress riceve ogni aggiornamento (fase, percentuale, tempo stimato).
+export const waitForJob = async (jobId, onProgress) => {
+  let version = -1;
+  while (true) {
+    const response = await fetch(
+      `${process.env.NEXT_PUBLIC_BE_API_URL}/jobs/${jobId}/wait?since=${version}&timeout=25`
+    );
+    if (!response.ok) {
+      throw new Error(`Stato del job non disponibile (${response.status})`);
+    }
+    const job = await response.json();
+    version = job.version;
+    if (onProgress) {
+      onProgress(job);
+    }
+
+    if (job.status === "completed") {
+      return job.result;
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error_message || "Job non riuscito");
+    }
+    if (job.status === "cancelled") {
+      throw new Error("Job annullato");
+    }
+  }
+};
+
+// Segue un job in streaming con Server-Sent Events su /jobs/{id}/events.
+// onProgress riceve ogni aggiornamento di stato, onText il testo generato finora
+// (per i riassunti, man mano che il modello lo produce).
+export const followJob = (jobId, { onProgress, onText } = {}) =>
+  new Promise((resolve, reject) => {
+    const source = new EventSource(`${process.env.NEXT_PUBLIC_BE_API_URL}/jobs/${jobId}/events`);
+    let text = "";
+
+    source.addEventListener("delta", (event) => {
+      const delta = JSON.parse(event.data);
+      // Il frammento sostituisce il testo da `offset` in poi (offset 0: generazione ripartita)
+      if (delta.offset > text.length) {
+        return;
+      }
+      text = text.slice(0, delta.offset) + delta.text;
+      if (onText) {
+        onText(text);
+      }
+    });
+
+    source.addEventListener("job", (event) => {
+      const job = JSON.parse(event.data);
+      if (onProgress) {
+        onProgress(job);
+      }
+      if (job.status === "completed") {
+        source.close();
+        resolve(job.result);
+      } else if (job.status === "failed" || job.status === "cancelled") {
+        source.close();
+        reject(new Error(job.error_message || "Job non riuscito"));
+      }
+    });
+
+    source.onerror = () => {
+      // Connessione chiusa senza stato finale: si prosegue con il long-poll
+      source.close();
+      waitForJob(jobId, onProgress).then(resolve, reject);
+    };
+  });